@@ -7,6 +7,15 @@ History
 """
 import os
 import csv
+import threading
+try:
+    import cPickle
+except ImportError:
+    import pickle as cPickle
+try:
+    import Queue as queue
+except ImportError:
+    import queue
 
 
 def loadLns(inpath):
@@ -26,6 +35,117 @@ def loadLns(inpath):
     return lines
 
 
+def loadLnsIter(inpath, nBat=None, chunkSiz=1 << 22, isMmap=False):
+    """
+    Iterate over the lines of a file without loading it entirely.
+
+    The file is read in fixed-size chunks that are split at the last
+    newline, so the peak memory is bounded by chunkSiz no matter how
+    large the file is.
+
+    Input
+      inpath    -  input path, string
+      nBat      -  #lines per batch, {None} | 1000 | ...
+                     None: yield one line at a time
+      chunkSiz  -  #bytes to read per chunk, {1 << 22} | ...
+      isMmap    -  flag of reading through mmap, True | {False}
+
+    Output
+      lines     -  iterator of lines, or of batches of lines (list)
+                   if nBat is given
+    """
+    import itertools
+
+    if nBat is None:
+        # iterate the chunk lists in C, no generator frame per line
+        return itertools.chain.from_iterable(
+            _lnsChunks(inpath, chunkSiz, isMmap))
+
+    assert nBat > 0
+    return _lnsBats(inpath, nBat, chunkSiz, isMmap)
+
+
+def _lnsBats(inpath, nBat, chunkSiz, isMmap):
+    """
+    Read a file chunk by chunk and yield batches of lines.
+
+    Input
+      inpath    -  input path, string
+      nBat      -  #lines per batch
+      chunkSiz  -  #bytes to read per chunk
+      isMmap    -  flag of reading through mmap, True | False
+
+    Output
+      bats      -  generator of batches of lines (list)
+    """
+    bat = []
+    for lines in _lnsChunks(inpath, chunkSiz, isMmap):
+        bat.extend(lines)
+        if len(bat) < nBat:
+            continue
+
+        # full batches
+        nFull = len(bat) // nBat * nBat
+        for i in range(0, nFull, nBat):
+            yield bat[i : i + nBat]
+        bat = bat[nFull:]
+
+    if len(bat) > 0:
+        yield bat
+
+
+def _lnsChunks(inpath, chunkSiz, isMmap):
+    """
+    Read a file chunk by chunk and yield the complete lines of each chunk.
+
+    Input
+      inpath    -  input path, string
+      chunkSiz  -  #bytes to read per chunk
+      isMmap    -  flag of reading through mmap, True | False
+
+    Output
+      lines     -  generator of line lists, one per chunk
+    """
+    with open(inpath, 'r') as fo:
+        if isMmap:
+            import mmap
+
+            # mmap can not map an empty file
+            if os.fstat(fo.fileno()).st_size == 0:
+                return
+            src = mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            src = fo
+
+        # mmap returns bytes under python 3, decoded as open() would
+        eol = b'\n' if isMmap else '\n'
+        enc = None
+        if not isinstance(eol, str):
+            import locale
+            enc = locale.getpreferredencoding(False)
+        try:
+            rest = eol[:0]
+            while True:
+                block = src.read(chunkSiz)
+                if not block:
+                    break
+
+                # cut after the last newline, keep the tail for the next chunk
+                pos = block.rfind(eol)
+                if pos < 0:
+                    rest += block
+                    continue
+                txt = rest + block[: pos + 1]
+                rest = block[pos + 1 :]
+                yield (txt if enc is None else txt.decode(enc)).splitlines()
+
+            if rest:
+                yield (rest if enc is None else rest.decode(enc)).splitlines()
+        finally:
+            if isMmap:
+                src.close()
+
+
 def saveLns(lines, outpath, subx=None):
     """
     Write a list of line into a file.
@@ -47,6 +167,60 @@ def saveLns(lines, outpath, subx=None):
     fio.close()
 
 
+def saveLnsBulk(lines, outpath, subx=None, nBat=10000, bufSiz=1 << 20):
+    """
+    Write lines into a file in large batches.
+
+    Same output as saveLns, but each batch of lines is joined and encoded
+    once and written with a single call.
+
+    Input
+      lines    -  lines, any iterable (list, generator, ...)
+      outpath  -  output path, string
+      subx     -  subfix of each line, {None} | '\n' | ...
+      nBat     -  #lines joined per write, {10000} | ...
+      bufSiz   -  file buffer size in bytes, {1 << 20} | ...
+    """
+    import itertools
+
+    assert nBat > 0
+    sep = '' if subx is None else subx
+    it = iter(lines)
+    with open(outpath, 'w', bufSiz) as fo:
+        while True:
+            bat = list(itertools.islice(it, nBat))
+            if len(bat) == 0:
+                break
+            fo.write(_lnsJoin(bat, sep))
+
+
+def _lnsJoin(lines, sep):
+    """
+    Join a batch of lines into one utf8-encoded string.
+
+    Input
+      lines  -  lines, 1 x n (list)
+      sep    -  subfix appended to each line
+
+    Output
+      buf    -  joined string
+    """
+    try:
+        buf = sep.join(lines) + sep
+    except UnicodeDecodeError:
+        # non-ascii byte strings mixed with unicode ones
+        lines = [line if isinstance(line, str) else line.encode('utf8')
+                 for line in lines]
+        if not isinstance(sep, str):
+            sep = sep.encode('utf8')
+        buf = sep.join(lines) + sep
+
+    # unicode under python 2
+    if not isinstance(buf, str):
+        buf = buf.encode('utf8')
+    return buf
+
+
 def mkDir(dirPath, mkL=0):
     """
     Make a fold if not existed.
@@ -78,6 +252,124 @@ def cpFile(pathSrc, pathDst):
     shutil.copyfile(pathSrc, pathDst)
 
 
+def cpFiles(pathPairs, nThd=8, isMkDir=True):
+    """
+    Copy many files in parallel.
+
+    On Linux the data is moved by the kernel (copy_file_range or
+    sendfile) when the python version has them.
+
+    Input
+      pathPairs  -  (src path, dst path) pairs, n x (list)
+      nThd       -  #threads, {8} | ...
+      isMkDir    -  flag of creating the dst folds as mkDir, {True} | False
+
+    Output
+      nByte      -  #bytes copied
+      ti         -  time in seconds
+    """
+    import time
+    from multiprocessing.pool import ThreadPool
+
+    ti0 = time.time()
+
+    # create the folds up front, threads would race on makedirs
+    if isMkDir:
+        folds = set(os.path.dirname(pathDst) for _, pathDst in pathPairs)
+        for fold in folds:
+            if fold != '':
+                mkDir(fold)
+
+    if nThd > 1:
+        pool = ThreadPool(nThd)
+        try:
+            nBytes = pool.map(_cpFileFast, pathPairs, chunksize=16)
+        finally:
+            pool.terminate()
+    else:
+        nBytes = [_cpFileFast(pathPair) for pathPair in pathPairs]
+
+    return sum(nBytes), time.time() - ti0
+
+
+def _cpFileFast(pathPair):
+    """
+    Copy the content of one file, in the kernel if possible.
+
+    Input
+      pathPair  -  (src path, dst path)
+
+    Output
+      nByte     -  #bytes copied
+    """
+    import shutil
+
+    pathSrc, pathDst = pathPair
+    with open(pathSrc, 'rb') as fi:
+        with open(pathDst, 'wb') as fo:
+            nByte = os.fstat(fi.fileno()).st_size
+            for name in ['copy_file_range', 'sendfile']:
+                if hasattr(os, name):
+                    nByteCp = _cpFd(name, fi.fileno(), fo.fileno(), nByte)
+                    if nByteCp is not None:
+                        return nByteCp
+
+                    # start over from an empty dst
+                    os.lseek(fi.fileno(), 0, os.SEEK_SET)
+                    os.lseek(fo.fileno(), 0, os.SEEK_SET)
+                    os.ftruncate(fo.fileno(), 0)
+
+            # portable fallback, from wherever the kernel copy stopped
+            fi.seek(0)
+            fo.seek(0)
+            fo.truncate()
+            shutil.copyfileobj(fi, fo, 1 << 20)
+            return fo.tell()
+
+
+def _cpFd(name, fdSrc, fdDst, nByte):
+    """
+    Copy between two file descriptors with os.copy_file_range or os.sendfile.
+
+    The copy runs until the call returns 0, st_size is only a lower bound:
+    files growing meanwhile are copied to the end, and files whose size
+    the kernel does not know (procfs, some FUSE / NFS) copy nothing or
+    stop early, both reported as not supported.
+
+    Input
+      name    -  function name, 'copy_file_range' | 'sendfile'
+      fdSrc   -  src descriptor
+      fdDst   -  dst descriptor
+      nByte   -  #bytes expected, st_size of the src
+
+    Output
+      nByteCp -  #bytes copied, None if the call is not supported for
+                 these files or copied less than nByte
+    """
+    import errno
+
+    func = getattr(os, name)
+    pos = 0
+    try:
+        while True:
+            if name == 'sendfile':
+                n = func(fdDst, fdSrc, pos, 1 << 30)
+            else:
+                n = func(fdSrc, fdDst, 1 << 30)
+            if n == 0:
+                break
+            pos += n
+    except OSError as e:
+        if e.errno in (errno.EINVAL, errno.ENOSYS, errno.EXDEV,
+                       errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF):
+            return None
+        raise
+
+    if pos == 0 or pos < nByte:
+        return None
+    return pos
+
+
 def rmFile(path):
     """
     Delete file if exist.
@@ -89,7 +381,8 @@ def rmFile(path):
         os.remove(path)
 
 
-def save(filepath, data, svL=1):
+def save(filepath, data, svL=1, type='pkl', codec=None, level=None,
+         nSegMa=16):
     """
     Save data as a pickle format.
 
@@ -97,285 +390,1293 @@ def save(filepath, data, svL=1):
       filepath  -  file name
       data      -  data
       svL       -  save level
+      type      -  format, {'pkl'} | 'np' | 'ckpt'
+                     'pkl':  plain pickle
+                     'np':   pickle with the numpy arrays stored out-of-band
+                             as raw aligned blocks, see load(mmapMode=...)
+                     'ckpt': delta checkpoint of a dict, only the values
+                             changed since the last save are appended
+      codec     -  compression of the 'pkl' format,
+                   {None} | 'zlib' | 'bz2' | 'lzma'
+      level     -  compression level, {None} | 1 | ... | 9
+                     None: the codec's default
+      nSegMa    -  #segments of a 'ckpt' file before it is compacted,
+                   {16} | ...
     """
-    import cPickle
-
     if svL == 0 or filepath is None:
         return
 
-    with open(filepath, "w") as fo:
-        cPickle.dump(data, fo, protocol=cPickle.HIGHEST_PROTOCOL)
+    if type == 'pkl' and codec is None:
+        with open(filepath, "wb") as fo:
+            cPickle.dump(data, fo, protocol=cPickle.HIGHEST_PROTOCOL)
+    elif type == 'pkl':
+        # a bad codec or level fails before the old file is truncated
+        fz = _CodecW(None, codec, level)
+        with open(filepath, 'wb') as fo:
+            fo.write(_codecMagic + codec.ljust(4).encode('ascii'))
+            fz.fo = fo
+            cPickle.dump(data, fz, protocol=cPickle.HIGHEST_PROTOCOL)
+            fz.close()
+    elif type == 'np':
+        if codec is not None:
+            raise Exception('codec is not supported by type np: {}'.format(codec))
+        with open(filepath, 'wb') as fo:
+            _saveNp(fo, data)
+    elif type == 'ckpt':
+        _ckptSave(filepath, data, nSegMa)
+    else:
+        raise Exception('unknown type: {}'.format(type))
 
 
-def load(filename):
+def load(filename, mmapMode=None):
     """
     Load data from a pickle-format file.
 
+    The format and codec used by save are detected from the file header.
+
     Input
       filename  -  filename
+      mmapMode  -  memory-map mode for arrays saved with type='np',
+                   {None} | 'r' | 'r+' | 'c'
+                     None: read the arrays into memory
 
     Output
       data      -  data
     """
-    import cPickle
-
-    fo = open(filename, 'r')
-    data = cPickle.load(fo)
-    fo.close()
+    fo = open(filename, 'rb')
+    try:
+        head = fo.read(len(_npMagic))
+        if head == _npMagic:
+            data = _loadNp(fo, filename, mmapMode)
+        elif head == _ckptMagic:
+            data = _ckptLoad(fo)
+        elif head[: len(_codecMagic)] == _codecMagic:
+            codec = head[len(_codecMagic) :].decode('ascii').strip()
+            data = cPickle.load(_CodecR(fo, codec))
+        else:
+            fo.seek(0)
+            data = cPickle.load(fo)
+    finally:
+        fo.close()
     return data
 
 
-def loadH5(filename, varNm, dtype=None):
+# header of the file saved with save(type='np')
+_npMagic = b'FIONP\x00\x01\n'
+
+# header of the file saved with save(codec=...), followed by the codec name
+_codecMagic = b'FIOZ'
+
+
+def _codecNew(codec, isW, level=None):
     """
-    Load data from a hdf5 file.
+    Create a streaming compressor or decompressor.
 
     Input
-      filename  -  filename
-      varNm     -  variable name
-      dtype     -  type, {None} | np.double | ...
+      codec  -  codec name, 'zlib' | 'bz2' | 'lzma'
+      isW    -  flag of compressor, True | False
+      level  -  compression level, {None} | 1 | ... | 9
 
     Output
-      data      -  data
+      co     -  compressor or decompressor object
     """
-    import h5py
-    import numpy as np
+    if codec == 'zlib':
+        import zlib
+        if not isW:
+            return zlib.decompressobj()
+        return zlib.compressobj(-1 if level is None else level)
+
+    if codec == 'bz2':
+        import bz2
+        if not isW:
+            return bz2.BZ2Decompressor()
+        return bz2.BZ2Compressor(9 if level is None else level)
+
+    if codec == 'lzma':
+        try:
+            import lzma
+        except ImportError:
+            from backports import lzma
+        if not isW:
+            return lzma.LZMADecompressor()
+        return lzma.LZMACompressor(preset=level)
 
-    file = h5py.File(filename, 'r')
-    data0 = file[varNm]
-    if dtype is None:
-        data = np.asarray(data0)
-    else:
-        data = np.asarray(data0, dtype=dtype)
-    file.close()
-    return data
+    raise Exception('unknown codec: {}'.format(codec))
 
 
-def saveH5(filename, data, varNm):
+class _CodecW(object):
     """
-    Save data in hdf5 file.
+    Write-only file object compressing everything written to it.
+    """
+
+    def __init__(self, fo, codec, level=None):
+        self.fo = fo
+        self.co = _codecNew(codec, True, level)
+
+    def write(self, data):
+        buf = self.co.compress(data)
+        if buf:
+            self.fo.write(buf)
+
+    def close(self):
+        self.fo.write(self.co.flush())
+
+
+class _CodecR(object):
+    """
+    Read-only file object decompressing a file chunk by chunk.
+    """
+
+    def __init__(self, fo, codec, chunkSiz=1 << 20):
+        self.fo = fo
+        self.co = _codecNew(codec, False)
+        self.chunkSiz = chunkSiz
+        self.buf = b''
+        self.pos = 0
+
+    def _more(self, n):
+        # decompress until n bytes are buffered, joining the chunks once
+        parts = [self.buf[self.pos :]]
+        nHas = len(parts[0])
+        while n < 0 or nHas < n:
+            block = self.fo.read(self.chunkSiz)
+            if not block:
+                break
+            parts.append(self.co.decompress(block))
+            nHas += len(parts[-1])
+        self.buf = b''.join(parts)
+        self.pos = 0
+        return nHas
+
+    def read(self, n=-1):
+        if n < 0 or len(self.buf) - self.pos < n:
+            nHas = self._more(n)
+            n = nHas if n < 0 else min(n, nHas)
+        data = self.buf[self.pos : self.pos + n]
+        self.pos += n
+        return data
+
+    def readline(self):
+        i = self.buf.find(b'\n', self.pos)
+        while i < 0:
+            nHas = len(self.buf) - self.pos
+            if self._more(nHas + 1) == nHas:
+                return self.read()
+            i = self.buf.find(b'\n')
+        return self.read(i + 1 - self.pos)
+
+
+# header of the file saved with save(type='ckpt')
+_ckptMagic = b'FIOCKPT\x01'
+
+# state of the checkpoint files saved in this process, path ->
+# {'stat': (size, mtime), 'keys', 'hashes', 'nSeg', 'end', 'nByteFull'}
+_ckptCache = {}
+
+
+def _ckptSave(filepath, data, nSegMa):
+    """
+    Save a dict as a delta checkpoint.
+
+    Layout
+      magic | segment | segment | ...
+      segment: #bytes of head and body (16 bytes) | head | body
+      head: pickle of {'keys': all keys, 'hashes': key -> hash of the
+            values in body, 'isFull': body holds every value}
+      body: pickle of the changed values, key -> value
+
+    The lengths are written last, so a segment cut by a crash is ignored.
+    The file is rewritten with one full segment once it has nSegMa
+    segments or is twice the size of its last full segment.
 
     Input
-      filename  -  filename
-      data      -  data
-      varNm     -  variable name
+      filepath  -  file name
+      data      -  data, dict
+      nSegMa    -  maximum #segments
     """
-    import h5py
-    file = h5py.File(filename, "w")
-    file.create_dataset(varNm, data=data)
-    file.close()
+    if not isinstance(data, dict):
+        raise Exception('ckpt needs a dict: {}'.format(data.__class__))
+
+    hashes = dict((key, _ckptHash(val)) for key, val in data.items())
+    st = _ckptState(filepath)
+
+    if st is None or st['nSeg'] + 1 > nSegMa or st['end'] > 2 * st['nByteFull']:
+        # compact, through a temporary file renamed over the old one
+        pathTmp = filepath + '.tmp'
+        with open(pathTmp, 'wb') as fo:
+            fo.write(_ckptMagic)
+            end = _ckptSegW(fo, len(_ckptMagic), data, hashes, True)
+        os.rename(pathTmp, filepath)
+        st = {'nSeg': 1,
+              'end': end,
+              'nByteFull': end}
+    else:
+        keyNews = [key for key in data if st['hashes'].get(key) != hashes[key]]
+        vals = dict((key, data[key]) for key in keyNews)
+        hashNews = dict((key, hashes[key]) for key in keyNews)
+        with open(filepath, 'r+b') as fo:
+            st['end'] = _ckptSegW(fo, st['end'], vals, hashNews, False,
+                                  keys=list(data.keys()))
+        st['nSeg'] += 1
 
+    st['keys'] = list(data.keys())
+    st['hashes'] = hashes
+    st['stat'] = _ckptStat(filepath)
+    _ckptCache[filepath] = st
 
-def savePath(fold, prex, subx=None, type=None):
+
+def _ckptLoad(fo):
     """
-    Get the save path.
+    Rebuild the latest state of a delta checkpoint.
 
     Input
-      fold  -  fold
-      prex  -  path prefix
-      subx  -  subfix, {None}
-      type  -  type, None
+      fo    -  file handle positioned after the magic
 
     Output
-      path  -  file path
+      data  -  data, dict
     """
-    saveFold = os.getenv('save', os.path.join(os.environ['HOME'], 'save'))
-    saveFold = os.path.join(saveFold, fold)
-
-    # create fold if necessary
-    mkDir(saveFold)
+    data = {}
+    for head, posBody in _ckptSegs(fo):
+        fo.seek(posBody)
+        if head['isFull']:
+            data = {}
+        data.update(cPickle.load(fo))
+        data = dict((key, data[key]) for key in head['keys'])
+    return data
 
-    # subfix
-    if subx is not None:
-        prex = prex + '_' + subx
 
-    if type is None:
-        path = os.path.join(saveFold, prex)
-    elif type == 'txt':
-        path = os.path.join(saveFold, prex + '.txt')
-    else:
-        raise Exception('unknown type: {}'.format(type))
-    return path
+def _ckptState(filepath):
+    """
+    Get the keys and hashes of the latest state of a checkpoint file,
+    from the cache or by reading the segment heads.
 
+    Input
+      filepath  -  file name
 
-def exist(nm, type='file'):
+    Output
+      st        -  state, None if the file is missing or not a checkpoint
     """
-    Check whether the name eixst.
+    if not os.path.exists(filepath):
+        return None
+    st = _ckptCache.get(filepath)
+    if st is not None and st['stat'] == _ckptStat(filepath):
+        return st
+
+    with open(filepath, 'rb') as fo:
+        if fo.read(len(_ckptMagic)) != _ckptMagic:
+            return None
+
+        st = {'keys': [],
+              'hashes': {},
+              'nSeg': 0,
+              'end': len(_ckptMagic),
+              'nByteFull': 0}
+        for head, posBody in _ckptSegs(fo):
+            if head['isFull']:
+                st['hashes'] = {}
+            st['hashes'].update(head['hashes'])
+            st['hashes'] = dict((key, st['hashes'][key]) for key in head['keys'])
+            st['keys'] = head['keys']
+            st['nSeg'] += 1
+            st['end'] = head['end']
+            if head['isFull']:
+                st['nByteFull'] = head['end']
+
+    if st['nSeg'] == 0:
+        return None
+    return st
+
+
+def _ckptSegs(fo):
+    """
+    Iterate over the complete segments of a checkpoint file.
 
     Input
-      nm    -  name
-      type  -  type, {'file'}
+      fo       -  file handle positioned after the magic
 
     Output
-      res   -  status, 'True' | 'False'
+      segs     -  generator of (head, body position), head['end'] is the
+                  position after the segment
     """
+    import struct
 
-    if nm is None:
-        return False
-
-    if type == 'file':
-        return os.path.isfile(nm)
+    size = os.fstat(fo.fileno()).st_size
+    pos = len(_ckptMagic)
+    while pos + 16 <= size:
+        fo.seek(pos)
+        nHead, nBody = struct.unpack('<QQ', fo.read(16))
+        end = pos + 16 + nHead + nBody
+        if nHead == 0 or end > size:
+            # cut by a crash
+            break
 
-    else:
-        raise Exception('unknown type: {}'.format(type))
+        head = cPickle.loads(fo.read(nHead))
+        head['end'] = end
+        yield head, pos + 16 + nHead
+        pos = end
 
 
-def listFold(fold):
+def _ckptSegW(fo, pos, vals, hashes, isFull, keys=None):
     """
-    Return the list of all folders under a folder.
+    Write one segment of a checkpoint file.
 
     Input
-      fold       -  root fold
+      fo      -  file handle
+      pos     -  position of the segment
+      vals    -  values to store, key -> value
+      hashes  -  their hashes, key -> hash
+      isFull  -  flag of a full segment
+      keys    -  all keys of the state, {None}: the keys of vals
 
     Output
-      foldNms    -  directory name list, 1 x n (list)
-      foldPaths  -  directory path list, 1 x n (list)
+      end     -  position after the segment
     """
-    foldNms = []
-    foldPaths = []
+    import struct
 
-    for foldNm in os.listdir(fold):
-        # fold absolute path
-        foldPath = os.path.join(fold, foldNm)
-
-        # skip non fold
-        if not os.path.isdir(foldPath):
-            continue
+    if keys is None:
+        keys = list(vals.keys())
+    head = cPickle.dumps({'keys': keys, 'hashes': hashes, 'isFull': isFull},
+                         cPickle.HIGHEST_PROTOCOL)
 
-        # store
-        foldNms.append(foldNm)
-        foldPaths.append(foldPath)
+    # lengths left at zero until the body is written
+    fo.seek(pos)
+    fo.truncate()
+    fo.write(struct.pack('<QQ', 0, 0))
+    fo.write(head)
+    cPickle.dump(vals, fo, protocol=cPickle.HIGHEST_PROTOCOL)
+    end = fo.tell()
+    fo.flush()
 
-    return foldNms, foldPaths
+    fo.seek(pos)
+    fo.write(struct.pack('<QQ', len(head), end - pos - 16 - len(head)))
+    fo.flush()
+    return end
 
 
-def listFoldR(fold):
+def _ckptHash(val):
     """
-    Return the list of all folders recursively under a folder.
+    Hash a value to detect its changes between two checkpoints.
 
     Input
-      fold       -  root fold
+      val  -  value
 
     Output
-      foldNms    -  directory name list, 1 x n (list)
-      foldPaths  -  directory path list, 1 x n (list)
+      h    -  hash
     """
-    foldNms = []
-    foldPaths = []
-
-    # each sub file
-    for dirname, dirNms, fileNms in os.walk(fold):
-        for dirNm in dirNms:
-            # file and cmd path
-            foldPath = os.path.join(dirname, dirNm)
-
-            # store
-            foldNms.append(dirNm)
-            foldPaths.append(foldPath)
+    import hashlib
+    import zlib
+    import numpy as np
 
-    return foldNms, foldPaths
+    # subclasses (masked, matrix, recarray) carry more than the buffer
+    if type(val) in (np.ndarray, np.memmap) and not val.dtype.hasobject:
+        # crc32 and adler32 of the buffer directly, 4x faster than md5
+        buf = np.ascontiguousarray(val).view(np.uint8).reshape(-1)
+        return (val.dtype.str, val.shape,
+                zlib.crc32(buf) & 0xffffffff, zlib.adler32(buf) & 0xffffffff)
+    return hashlib.md5(cPickle.dumps(val, cPickle.HIGHEST_PROTOCOL)).digest()
 
 
-def listFile(fold, subx=None):
+def _ckptStat(filepath):
     """
-    Return the list of all files matched with the subfix under a folder.
+    Return the (size, mtime) of a file, to validate the checkpoint cache.
 
     Input
-      fold       -  root fold
-      subx       -  subfix, {None} | 'txt' | ...
+      filepath  -  file name
 
     Output
-      fileNms    -  directory name list, n x
-      filePaths  -  directory path list, n x
+      stat      -  (size, mtime)
     """
-    fileNms = []
-    filePaths = []
+    st = os.stat(filepath)
+    return st.st_size, st.st_mtime
 
-    for foldNm in os.listdir(fold):
-        # fold absolute path
-        filePath = os.path.join(fold, foldNm)
 
-        # skip non fold
-        if os.path.isdir(filePath):
-            continue
+# alignment of each raw array block in bytes
+_npAlign = 64
 
-        # skip filepath
-        if subx is not None and not filePath.endswith(subx):
-            continue
 
-        # store
-        fileNms.append(foldNm)
-        filePaths.append(filePath)
+def _saveNp(fo, data):
+    """
+    Write data with its numpy arrays out-of-band.
 
-    return fileNms, filePaths
+    Layout
+      magic | header length (8 bytes) | header | aligned raw blocks
 
+    The header is a pickle of (metas, body), where body is the pickle of
+    data with each array replaced by its index in metas.
 
-def listFileR(fold, subx=None):
+    Input
+      fo    -  file handle opened in 'wb'
+      data  -  data
     """
-    Return the list of all files matched with the subfix recursively
-    under a folder.
+    import struct
+    import numpy as np
+
+    # pickle the structure, collect the arrays
+    As = []
+    metas = []
+    idxs = {}
+    off = [0]
+
+    def persId(obj):
+        # subclasses (masked, matrix, recarray) carry more than the buffer
+        if type(obj) not in (np.ndarray, np.memmap) or obj.dtype.hasobject:
+            return None
+
+        # the same array referenced twice is stored once
+        if id(obj) in idxs:
+            return idxs[id(obj)]
+
+        # fortran arrays are written transposed to avoid a copy
+        isF = obj.flags.f_contiguous and not obj.flags.c_contiguous
+        A = obj.T if isF else obj
+        metas.append((obj.dtype, obj.shape, isF, off[0]))
+        As.append(A)
+        off[0] += _alignUp(obj.nbytes, _npAlign)
+        idxs[id(obj)] = str(len(metas) - 1)
+        return idxs[id(obj)]
+
+    import io
+    buf = io.BytesIO()
+    pk = cPickle.Pickler(buf, cPickle.HIGHEST_PROTOCOL)
+    pk.persistent_id = persId
+    pk.dump(data)
+    head = cPickle.dumps((metas, buf.getvalue()), cPickle.HIGHEST_PROTOCOL)
+
+    # header
+    fo.write(_npMagic)
+    fo.write(struct.pack('<Q', len(head)))
+    fo.write(head)
+    pos = len(_npMagic) + 8 + len(head)
+    _padTo(fo, pos, _alignUp(pos, _npAlign))
+
+    # raw blocks
+    for A in As:
+        nByte = A.nbytes
+        if nByte > 0:
+            A.tofile(fo)
+        _padTo(fo, nByte, _alignUp(nByte, _npAlign))
+
+
+def _loadNp(fo, filename, mmapMode):
+    """
+    Read data written by _saveNp.
 
     Input
-      fold      -  root fold
-      subx      -  subfix, {None} | 'txt' | ...
+      fo        -  file handle positioned after the magic
+      filename  -  filename, used for memory-mapping
+      mmapMode  -  memory-map mode, None | 'r' | 'r+' | 'c'
 
     Output
-      fileNms    -  directory name list, n x
-      filePaths  -  directory path list, n x
+      data      -  data
     """
-    fileNms = []
-    filePaths = []
-
-    # each sub file
-    for dirname, dirnames, fileNms in os.walk(fold):
-        for fileNm in fileNms:
-            # skip filepath
-            if subx is not None and not fileNm.endswith(subx):
-                continue
+    import struct
+    import numpy as np
 
-            # file and cmd path
-            filePath = os.path.join(dirname, fileNm)
+    nHead = struct.unpack('<Q', fo.read(8))[0]
+    metas, body = cPickle.loads(fo.read(nHead))
+    pos0 = _alignUp(len(_npMagic) + 8 + nHead, _npAlign)
+
+    # arrays
+    As = []
+    for dtype, shape, isF, off in metas:
+        n = int(np.prod(shape))
+        order = 'F' if isF else 'C'
+        if n == 0:
+            A = np.empty(shape, dtype=dtype, order=order)
+        elif mmapMode is not None:
+            A = np.memmap(filename, dtype=dtype, mode=mmapMode,
+                          offset=pos0 + off, shape=shape, order=order)
+        else:
+            fo.seek(pos0 + off)
+            A = np.fromfile(fo, dtype=dtype, count=n).reshape(shape, order=order)
+        As.append(A)
+
+    import io
+    up = cPickle.Unpickler(io.BytesIO(body))
+    up.persistent_load = lambda pid: As[int(pid)]
+    return up.load()
+
+
+def _alignUp(n, align):
+    """
+    Round a number up to a multiple of the alignment.
 
-            # store
-            fileNms.append(dirname)
-            filePaths.append(filePath)
+    Input
+      n      -  number
+      align  -  alignment
 
-    return fileNms, filePaths
+    Output
+      m      -  aligned number
+    """
+    return (n + align - 1) // align * align
 
 
-def getch():
+def _padTo(fo, pos, posNew):
     """
-    Get one char from input.
+    Write zero bytes to move the file position from pos to posNew.
 
-    Output
-      c  -  character
+    Input
+      fo      -  file handle
+      pos     -  current position
+      posNew  -  new position
     """
-    import termios
-    import sys
-    import tty
-
-    fd = sys.stdin.fileno()
-    old_settings = termios.tcgetattr(fd)
-    try:
-        tty.setraw(fd)
-        c = sys.stdin.read(1)
-    finally:
-        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-    return c
+    if posNew > pos:
+        fo.write(b'\x00' * (posNew - pos))
 
 
-def loadCsv(csvPath, nLnSkip=0, delimiter=',', quotechar=None):
+def loadH5(filename, varNm, dtype=None, idx=None):
     """
-    Load from csv.
+    Load data from a hdf5 file.
 
     Input
-      csvPath    -  csv path
-      nLnSkip    -  #line to skip in the header, {0} | ...
-      delimiter  -  delimiter, {','} | ...
-      quotechar  -  quotechar, {None} | ...
+      filename  -  filename
+      varNm     -  variable name
+      dtype     -  type, {None} | np.double | ...
+      idx       -  rows to read, {None} | 3 | slice(0, 1000) | [4, 2, 9] | ...
+                     None: the whole variable
+                     int, slice or tuple: a hyperslab
+                     list, index or bool array: rows along the first
+                       dimension, in the given order
 
     Output
-      dcts       -  symbol list, n x
-      keys       -  key list, nKey x
+      data      -  data
+    """
+    import h5py
+    import numpy as np
+
+    file = h5py.File(filename, 'r')
+    try:
+        data0 = _h5Take(file[varNm], idx)
+    finally:
+        file.close()
+
+    if dtype is None:
+        data = np.asarray(data0)
+    else:
+        data = np.asarray(data0, dtype=dtype)
+    return data
+
+
+def saveH5(filename, data, varNm=None, mode='w', codec=None, level=None,
+           chunkByte=1 << 16):
+    """
+    Save data in hdf5 file.
+
+    Each array is chunked along its first dimension so that reading a
+    few rows only touches the chunks holding them.
+
+    Input
+      filename   -  filename
+      data       -  data, array | dict of arrays
+      varNm      -  variable name, None if data is a dict
+      mode       -  file mode, {'w'} | 'a'
+                      'w': overwrite the file
+                      'a': add to an existing file, replacing variables
+                           of the same name
+      codec      -  compression filter, {None} | 'gzip' | 'lzf'
+      level      -  gzip level, {None} | 0 | ... | 9
+      chunkByte  -  target #bytes per chunk, {1 << 16} | ...
+    """
+    import h5py
+    import numpy as np
+
+    if varNm is not None:
+        data = {varNm: data}
+
+    file = h5py.File(filename, mode)
+    try:
+        for nm, A in data.items():
+            A = np.asarray(A)
+            if nm in file:
+                del file[nm]
+
+            # filters only work on chunked datasets
+            chunks = _h5Chunk(A.shape, A.dtype, chunkByte)
+            if chunks is None:
+                file.create_dataset(nm, data=A)
+            else:
+                file.create_dataset(nm, data=A, chunks=chunks,
+                                    compression=codec,
+                                    compression_opts=level,
+                                    shuffle=codec is not None)
+    finally:
+        file.close()
+
+
+def _h5Chunk(shape, dtype, chunkByte):
+    """
+    Pick a chunk shape for row-wise access.
+
+    Input
+      shape      -  array shape
+      dtype      -  array type
+      chunkByte  -  target #bytes per chunk
+
+    Output
+      chunks     -  chunk shape, None if the array can not be chunked
+    """
+    import numpy as np
+
+    if len(shape) == 0 or 0 in shape:
+        return None
+
+    # whole rows, as many as fit in the budget
+    nByte = np.dtype(dtype).itemsize
+    nByteRow = int(np.prod(shape[1:])) * nByte
+    nRow = max(1, min(shape[0], chunkByte // max(1, nByteRow)))
+    chunks = [nRow] + list(shape[1:])
+
+    # a single row over the budget, split the trailing dimensions too
+    for i in range(1, len(shape)):
+        nByteRest = int(np.prod(chunks)) // chunks[i] * nByte
+        if nByteRest * chunks[i] <= chunkByte:
+            break
+        chunks[i] = max(1, min(shape[i], chunkByte // nByteRest))
+    return tuple(int(c) for c in chunks)
+
+
+def saveArr(arrPath, A):
+    """
+    Save an array in the raw array format, see arrWIn.
+
+    Input
+      arrPath  -  path
+      A        -  array, n x ...
+    """
+    import numpy as np
+
+    A = np.asarray(A)
+
+    # hold the writer lock of the old file while it is replaced
+    fo = None
+    if os.path.exists(arrPath):
+        fo = open(arrPath, 'rb')
+        _arrLock(fo, arrPath)
+
+    # readers of the old file keep their own copy
+    try:
+        pathTmp = arrPath + '.tmp'
+        ha = _arrWIn(pathTmp, A.dtype, A.shape[1:], True)
+        try:
+            arrW(ha, A)
+        finally:
+            arrWOut(ha)
+        os.rename(pathTmp, arrPath)
+    finally:
+        if fo is not None:
+            fo.close()
+
+
+def loadArr(arrPath, mmapMode='r'):
+    """
+    Load an array saved in the raw array format.
+
+    Only the rows committed when the header is read are mapped, so it is
+    safe to call while a writer is appending.
+
+    Input
+      arrPath   -  path
+      mmapMode  -  memory-map mode, {'r'} | 'r+' | 'c' | None
+                     None: read into memory
+
+    Output
+      A         -  array, n x ... (np.memmap unless mmapMode is None)
+    """
+    import numpy as np
+
+    with open(arrPath, 'rb') as fo:
+        dtype, shape, nRow = _arrHeadR(fo)
+        if nRow == 0:
+            return np.empty((0,) + shape, dtype=dtype)
+        if mmapMode is None:
+            fo.seek(_arrHeadSiz)
+            n = nRow * int(np.prod(shape))
+            return np.fromfile(fo, dtype=dtype, count=n).reshape((nRow,) + shape)
+
+    return np.memmap(arrPath, dtype=dtype, mode=mmapMode, offset=_arrHeadSiz,
+                     shape=(nRow,) + shape)
+
+
+def arrWIn(arrPath, dtype=None, shape=None):
+    """
+    Open a raw array file for appending rows, creating it if needed.
+
+    Layout
+      header (4096 bytes): magic | #rows | row type and shape
+      body: rows, C order, no padding
+
+    The #rows in the header is updated only after the rows are written,
+    so readers never see a partial row. One writer at a time is allowed.
+
+    Input
+      arrPath  -  path
+      dtype    -  row type, needed for a new file, {None} | np.float32 | ...
+      shape    -  row shape, needed for a new file, {None} | (128,) | ...
+
+    Output
+      ha       -  handles
+    """
+    return _arrWIn(arrPath, dtype, shape, False)
+
+
+def _arrWIn(arrPath, dtype, shape, isTrunc):
+    """
+    Open a raw array file for appending rows, see arrWIn.
+
+    The file is created without truncation and only changed once the
+    writer lock is held, so a refused writer never touches it.
+
+    Input
+      arrPath  -  path
+      dtype    -  row type
+      shape    -  row shape
+      isTrunc  -  flag of emptying the file once locked, True | False
+
+    Output
+      ha       -  handles
+    """
+    import numpy as np
+
+    fo = os.fdopen(os.open(arrPath, os.O_RDWR | os.O_CREAT), 'r+b')
+    _arrLock(fo, arrPath)
+    if isTrunc:
+        fo.truncate(0)
+
+    isNew = os.fstat(fo.fileno()).st_size == 0
+    if isNew:
+        if dtype is None or shape is None:
+            fo.close()
+            raise Exception('dtype and shape are needed for a new file: {}'
+                            .format(arrPath))
+        dtype = np.dtype(dtype)
+        shape = tuple(shape)
+        nRow = 0
+        _arrHeadW(fo, dtype, shape)
+    else:
+        dtype0, shape0, nRow = _arrHeadR(fo)
+        if (dtype is not None and np.dtype(dtype) != dtype0) or \
+           (shape is not None and tuple(shape) != shape0):
+            fo.close()
+            raise Exception('row mismatch: {} {} vs {} {}'.format(
+                dtype, shape, dtype0, shape0))
+        dtype, shape = dtype0, shape0
+
+    # store
+    ha = {'fo': fo,
+          'dtype': dtype,
+          'shape': shape,
+          'nRow': nRow,
+          'arr': arrPath}
+    return ha
+
+
+def arrW(ha, A):
+    """
+    Append rows to a raw array file.
+
+    Input
+      ha  -  handles
+      A   -  rows, n x ... | one row, ...
+    """
+    import struct
+    import numpy as np
+
+    A = np.ascontiguousarray(A, dtype=ha['dtype'])
+    if A.shape == ha['shape']:
+        A = A[np.newaxis]
+    if A.shape[1:] != ha['shape']:
+        raise Exception('row shape mismatch: {} vs {}'.format(
+            A.shape[1:], ha['shape']))
+
+    if len(A) == 0:
+        return
+
+    # rows first, then the header
+    fo = ha['fo']
+    nByteRow = ha['dtype'].itemsize * int(np.prod(ha['shape']))
+    fo.seek(_arrHeadSiz + ha['nRow'] * nByteRow)
+    A.tofile(fo)
+    fo.flush()
+
+    ha['nRow'] += len(A)
+    fo.seek(len(_arrMagic))
+    fo.write(struct.pack('<Q', ha['nRow']))
+    fo.flush()
+
+
+def arrWOut(ha):
+    """
+    Close a raw array writer.
+
+    Input
+      ha  -  handles
+    """
+    ha['fo'].close()
+
+
+# header of the raw array format
+_arrMagic = b'FIOARR\x00\x01'
+_arrHeadSiz = 4096
+
+
+def _arrLock(fo, arrPath):
+    """
+    Take the writer lock of a raw array file, closing it if refused.
+
+    Input
+      fo       -  file handle
+      arrPath  -  path
+    """
+    import fcntl
+
+    try:
+        fcntl.flock(fo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        fo.close()
+        raise Exception('already opened by another writer: {}'.format(arrPath))
+
+
+def _arrHeadW(fo, dtype, shape):
+    """
+    Write the header of a new raw array file.
+
+    Input
+      fo     -  file handle
+      dtype  -  row type
+      shape  -  row shape
+    """
+    import struct
+
+    descr = dtype.descr if dtype.fields is not None else dtype.str
+    txt = repr((descr, shape)).encode('ascii')
+    head = _arrMagic + struct.pack('<QI', 0, len(txt)) + txt
+    if len(head) > _arrHeadSiz:
+        raise Exception('type too long for the header: {}'.format(dtype))
+
+    fo.seek(0)
+    fo.write(head + b'\x00' * (_arrHeadSiz - len(head)))
+    fo.flush()
+
+
+def _arrHeadR(fo):
+    """
+    Read the header of a raw array file.
+
+    Input
+      fo     -  file handle
+
+    Output
+      dtype  -  row type
+      shape  -  row shape
+      nRow   -  #rows
+    """
+    import ast
+    import struct
+    import numpy as np
+
+    fo.seek(0)
+    head = fo.read(len(_arrMagic) + 12)
+    if head[: len(_arrMagic)] != _arrMagic:
+        raise Exception('not a raw array file: {}'.format(fo.name))
+    nRow, nTxt = struct.unpack('<QI', head[len(_arrMagic) :])
+    descr, shape = ast.literal_eval(fo.read(nTxt).decode('ascii'))
+
+    return np.dtype(descr), tuple(shape), nRow
+
+
+def savePath(fold, prex, subx=None, type=None):
+    """
+    Get the save path.
+
+    Input
+      fold  -  fold
+      prex  -  path prefix
+      subx  -  subfix, {None}
+      type  -  type, None
+
+    Output
+      path  -  file path
+    """
+    saveFold = os.getenv('save', os.path.join(os.environ['HOME'], 'save'))
+    saveFold = os.path.join(saveFold, fold)
+
+    # create fold if necessary
+    mkDir(saveFold)
+
+    # subfix
+    if subx is not None:
+        prex = prex + '_' + subx
+
+    if type is None:
+        path = os.path.join(saveFold, prex)
+    elif type == 'txt':
+        path = os.path.join(saveFold, prex + '.txt')
+    else:
+        raise Exception('unknown type: {}'.format(type))
+    return path
+
+
+def exist(nm, type='file'):
+    """
+    Check whether the name eixst.
+
+    Input
+      nm    -  name
+      type  -  type, {'file'}
+
+    Output
+      res   -  status, 'True' | 'False'
+    """
+
+    if nm is None:
+        return False
+
+    if type == 'file':
+        return os.path.isfile(nm)
+
+    else:
+        raise Exception('unknown type: {}'.format(type))
+
+
+def existMany(nms, type='file', nThd=1):
+    """
+    Check whether many names exist, one directory listing per folder.
+
+    Input
+      nms    -  names, n x (list)
+      type   -  type, {'file'}
+      nThd   -  #threads listing folders, {1} | 8 | ...
+
+    Output
+      res    -  status, n x (bool array)
+    """
+    import numpy as np
+
+    if type != 'file':
+        raise Exception('unknown type: {}'.format(type))
+
+    # group by parent fold, rpartition is much cheaper than os.path.split
+    idxs = {}
+    for i, nm in enumerate(nms):
+        if nm is None:
+            continue
+        fold, sep, fileNm = nm.rpartition(os.sep)
+        if sep and not fold:
+            fold = os.sep
+        if fold not in idxs:
+            idxs[fold] = ([], [])
+        idxs[fold][0].append(i)
+        idxs[fold][1].append(fileNm)
+
+    folds = list(idxs.keys())
+    if nThd > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(nThd)
+        try:
+            fileNmss = pool.map(_existDir, folds, chunksize=16)
+        finally:
+            pool.terminate()
+    else:
+        fileNmss = [_existDir(fold) for fold in folds]
+
+    res = np.zeros(len(nms), dtype=np.bool_)
+    for fold, fileNms in zip(folds, fileNmss):
+        iNms, nmFs = idxs[fold]
+        res[iNms] = [nmF in fileNms for nmF in nmFs]
+    return res
+
+
+def _existDir(fold):
+    """
+    Return the names of the files under a folder, as os.path.isfile sees them.
+
+    Input
+      fold     -  fold, '' for the current one
+
+    Output
+      fileNms  -  file names (set), empty if the fold can not be read
+    """
+    try:
+        entries = list(_scandir(fold or '.'))
+    except OSError:
+        return set()
+
+    fileNms = set()
+    for entry in entries:
+        try:
+            if entry.is_file():
+                fileNms.add(entry.name)
+        except OSError:
+            pass
+    return fileNms
+
+
+def listFold(fold, isCache=False):
+    """
+    Return the list of all folders under a folder.
+
+    Input
+      fold       -  root fold
+      isCache    -  flag of reusing the last listing while the fold's
+                    mtime is unchanged, True | {False}
+
+    Output
+      foldNms    -  directory name list, 1 x n (list)
+      foldPaths  -  directory path list, 1 x n (list)
+    """
+    return _listDir(fold, None, True, isCache)
+
+
+def listFoldR(fold, nThd=1):
+    """
+    Return the list of all folders recursively under a folder.
+
+    Input
+      fold       -  root fold
+      nThd       -  #threads reading directories, {1} | 8 | ...
+
+    Output
+      foldNms    -  directory name list, 1 x n (list)
+      foldPaths  -  directory path list, 1 x n (list)
+    """
+    foldNms = []
+    foldPaths = []
+
+    # each sub fold
+    for foldNm, foldPath in walkR(fold, isFold=True, nThd=nThd):
+        foldNms.append(foldNm)
+        foldPaths.append(foldPath)
+
+    return foldNms, foldPaths
+
+
+def listFile(fold, subx=None, isCache=False):
+    """
+    Return the list of all files matched with the subfix under a folder.
+
+    Input
+      fold       -  root fold
+      subx       -  subfix, {None} | 'txt' | ...
+      isCache    -  flag of reusing the last listing while the fold's
+                    mtime is unchanged, True | {False}
+
+    Output
+      fileNms    -  file name list, n x
+      filePaths  -  file path list, n x
+    """
+    return _listDir(fold, subx, False, isCache)
+
+
+def listCacheClr():
+    """
+    Clear the listing cache used by listFile and listFold.
+    """
+    _listCache.clear()
+
+
+# listing cache, (fold, subx, isFold) -> (mtime, nms, paths)
+_listCache = {}
+
+
+def _listDir(fold, subx, isFold, isCache):
+    """
+    List the files or folders under a folder, through the cache if asked.
+
+    A listing is only cached when the fold's mtime is older than the
+    file system's timestamp resolution, otherwise a change made in the
+    same tick would go unnoticed.
+
+    Input
+      fold     -  root fold
+      subx     -  subfix, None | 'txt' | ...
+      isFold   -  flag of listing folders instead of files, True | False
+      isCache  -  flag of using the cache, True | False
+
+    Output
+      nms      -  name list, n x
+      paths    -  path list, n x
+    """
+    import time
+
+    # one stat, also raises if the fold does not exist
+    mtime = os.stat(fold).st_mtime
+    key = (fold, subx, isFold)
+    if isCache and key in _listCache and _listCache[key][0] == mtime:
+        _, nms, paths = _listCache[key]
+        return list(nms), list(paths)
+
+    # a file or unreadable fold raises, as os.listdir does
+    items, _ = _walkDir(fold, subx, isFold, True)
+    nms = [nm for nm, path in items]
+    paths = [path for nm, path in items]
+
+    if isCache and time.time() - mtime > 2:
+        _listCache[key] = (mtime, nms, paths)
+        return list(nms), list(paths)
+    return nms, paths
+
+
+def listFileR(fold, subx=None, nThd=1):
+    """
+    Return the list of all files matched with the subfix recursively
+    under a folder.
+
+    Input
+      fold      -  root fold
+      subx      -  subfix, {None} | 'txt' | ...
+      nThd      -  #threads reading directories, {1} | 8 | ...
+
+    Output
+      fileNms    -  file name list, n x
+      filePaths  -  file path list, n x
+    """
+    fileNms = []
+    filePaths = []
+
+    # each sub file
+    for fileNm, filePath in walkR(fold, subx=subx, nThd=nThd):
+        fileNms.append(fileNm)
+        filePaths.append(filePath)
+
+    return fileNms, filePaths
+
+
+def walkR(fold, subx=None, isFold=False, nThd=8):
+    """
+    Iterate over all files (or folders) recursively under a folder.
+
+    Directories are read with scandir, so no extra stat is needed per
+    entry, and each level of the tree is read by a pool of threads.
+    Symbolic links to folders are listed but not followed, as os.walk.
+
+    Input
+      fold    -  root fold
+      subx    -  subfix of the names to keep, {None} | 'txt' | ...
+      isFold  -  flag of listing folders instead of files, True | {False}
+      nThd    -  #threads reading directories, {8} | ...
+                   1: read in the calling thread
+
+    Output
+      items   -  generator of (name, path), in no particular order
+    """
+    import functools
+
+    scan = functools.partial(_walkDir, subx=subx, isFold=isFold)
+    if nThd > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(nThd)
+        imap = functools.partial(pool.imap_unordered, chunksize=1)
+    else:
+        pool = None
+        imap = lambda func, folds: (func(fold) for fold in folds)
+
+    try:
+        folds = [fold]
+        while len(folds) > 0:
+            foldSubs = []
+            for items, subs in imap(scan, folds):
+                for item in items:
+                    yield item
+                foldSubs.extend(subs)
+            folds = foldSubs
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def _walkDir(fold, subx, isFold, isRaise=False):
+    """
+    Read one directory for walkR.
+
+    Input
+      fold     -  fold
+      subx     -  subfix of the names to keep, None | 'txt' | ...
+      isFold   -  flag of listing folders instead of files, True | False
+      isRaise  -  flag of raising if the fold can not be read, True | {False}
+                    False: skipped as in os.walk
+
+    Output
+      items    -  matched (name, path), n x (list)
+      subs     -  sub folders to descend into, m x (list)
+    """
+    items = []
+    subs = []
+    try:
+        entries = list(_scandir(fold))
+    except OSError:
+        if isRaise:
+            raise
+        # unreadable folder, skipped as in os.walk
+        return items, subs
+
+    for entry in entries:
+        try:
+            isDir = entry.is_dir()
+        except OSError:
+            isDir = False
+
+        if isDir and not entry.is_symlink():
+            subs.append(entry.path)
+        if isDir != isFold:
+            continue
+        if subx is not None and not entry.name.endswith(subx):
+            continue
+        items.append((entry.name, entry.path))
+
+    return items, subs
+
+
+def _scandir(fold):
+    """
+    os.scandir, or the scandir package under python 2.
+
+    Input
+      fold     -  fold
+
+    Output
+      entries  -  iterator of directory entries
+    """
+    try:
+        from os import scandir
+    except ImportError:
+        from scandir import scandir
+    return scandir(fold)
+
+
+def getch():
+    """
+    Get one char from input.
+
+    Output
+      c  -  character
+    """
+    import termios
+    import sys
+    import tty
+
+    fd = sys.stdin.fileno()
+    old_settings = termios.tcgetattr(fd)
+    try:
+        tty.setraw(fd)
+        c = sys.stdin.read(1)
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+    return c
+
+
+def loadCsv(csvPath, nLnSkip=0, delimiter=',', quotechar=None):
+    """
+    Load from csv.
+
+    Input
+      csvPath    -  csv path
+      nLnSkip    -  #line to skip in the header, {0} | ...
+      delimiter  -  delimiter, {','} | ...
+      quotechar  -  quotechar, {None} | ...
+
+    Output
+      dcts       -  symbol list, n x
+      keys       -  key list, nKey x
     """
     dcts = []
     with open(csvPath, 'rb') as csvfile:
@@ -391,111 +1692,1040 @@ def loadCsv(csvPath, nLnSkip=0, delimiter=',', quotechar=None):
                 nKey = len(row)
                 continue
 
-            # symbol
-            assert(len(row) == nKey)
-            dct = {}
-            for iKey, key in enumerate(keys):
-                dct[key] = row[iKey]
-            dcts.append(dct)
-    return dcts, keys
+            # symbol
+            assert(len(row) == nKey)
+            dct = {}
+            for iKey, key in enumerate(keys):
+                dct[key] = row[iKey]
+            dcts.append(dct)
+    return dcts, keys
+
+
+def loadCsvCol(csvPath, nLnSkip=0, delimiter=',', quotechar=None,
+               dtypes=None, nBat=100000):
+    """
+    Load from csv as one numpy array per column.
+
+    Input
+      csvPath    -  csv path
+      nLnSkip    -  #line to skip in the header, {0} | ...
+      delimiter  -  delimiter, {','} | ...
+      quotechar  -  quotechar, {None} | ...
+      dtypes     -  type of some columns, {None} | {'age': np.int32, ...}
+                    other columns are inferred as int64, float64 or
+                    string, widening chunk by chunk if needed
+      nBat       -  #rows converted at a time, {100000} | ...
+
+    Output
+      cols       -  columns, key -> array, nKey x (OrderedDict)
+      keys       -  key list, nKey x
+    """
+    import numpy as np
+    from collections import OrderedDict
+
+    keys, chunks = _csvChunks(csvPath, nLnSkip, delimiter, quotechar,
+                              dtypes, nBat)
+    chunks = list(chunks)
+
+    # inferred columns that ended as strings after numeric chunks lost
+    # their original text (e.g. '007'), read them again
+    keyStrs = [key for key in keys if key not in (dtypes or {}) and
+               len(set(chunk[key].dtype.kind in 'SU' for chunk in chunks)) > 1]
+    colStrs = _csvColStr(csvPath, nLnSkip, delimiter, quotechar, keyStrs)
+
+    cols = OrderedDict()
+    for key in keys:
+        if key in colStrs:
+            cols[key] = colStrs[key]
+        elif len(chunks) == 0:
+            cols[key] = np.array([], dtype=(dtypes or {}).get(key, np.str_))
+        else:
+            cols[key] = np.concatenate([chunk[key] for chunk in chunks])
+    return cols, keys
+
+
+def loadCsvIter(csvPath, nBat=100000, nLnSkip=0, delimiter=',',
+                quotechar=None, dtypes=None):
+    """
+    Iterate over a csv by chunks of rows, one numpy array per column.
+
+    Input
+      csvPath    -  csv path
+      nBat       -  #rows per chunk, {100000} | ...
+      nLnSkip    -  #line to skip in the header, {0} | ...
+      delimiter  -  delimiter, {','} | ...
+      quotechar  -  quotechar, {None} | ...
+      dtypes     -  type of some columns, {None} | ..., see loadCsvCol
+
+    Output
+      cols       -  generator of columns, key -> array, nKey x (OrderedDict)
+    """
+    keys, chunks = _csvChunks(csvPath, nLnSkip, delimiter, quotechar,
+                              dtypes, nBat)
+    for cols in chunks:
+        yield cols
+
+
+def _csvChunks(csvPath, nLnSkip, delimiter, quotechar, dtypes, nBat):
+    """
+    Read the csv header and return a generator of column chunks.
+
+    Input
+      csvPath    -  csv path
+      nLnSkip    -  #line to skip in the header
+      delimiter  -  delimiter
+      quotechar  -  quotechar
+      dtypes     -  type of some columns, None | dict
+      nBat       -  #rows per chunk
+
+    Output
+      keys       -  key list, nKey x
+      chunks     -  generator of columns, key -> array (OrderedDict)
+    """
+    import itertools
+
+    csvfile = open(csvPath, 'rb')
+    csvHa = csv.reader(csvfile, delimiter=delimiter, quotechar=quotechar)
+
+    # field name
+    for row in itertools.islice(csvHa, nLnSkip):
+        pass
+    keys = next(csvHa, [])
+
+    def chunks():
+        from collections import OrderedDict
+
+        dtypeFixs = {} if dtypes is None else dict(dtypes)
+        dtypeCurs = {}
+        with csvfile:
+            while True:
+                rows = list(itertools.islice(csvHa, nBat))
+                if len(rows) == 0:
+                    break
+                assert set(map(len, rows)) == set([len(keys)])
+
+                # transpose, then convert each column at once
+                cols = OrderedDict()
+                for key, col in zip(keys, zip(*rows)):
+                    if key in dtypeFixs:
+                        cols[key] = _csvColConv(col, dtypeFixs[key], True)
+                    else:
+                        cols[key] = _csvColConv(col, dtypeCurs.get(key), False)
+                        dtypeCurs[key] = cols[key].dtype
+                yield cols
+
+    return keys, chunks()
+
+
+def _csvColConv(col, dtype, isFix):
+    """
+    Convert a csv column of strings to a numpy array.
+
+    Input
+      col    -  column, n x (tuple of strings)
+      dtype  -  type, None | np.int64 | ...
+      isFix  -  flag of a user-given type, True | False
+                  False: dtype is the type inferred so far, try it and
+                         the wider ones int64 -> float64 -> string
+
+    Output
+      A      -  array, n x
+    """
+    import numpy as np
+
+    if isFix:
+        return _csvColParse(col, dtype)
+
+    dtypeCands = [np.int64, np.float64]
+    if dtype is not None:
+        if dtype.kind not in 'if':
+            return np.array(col)
+        dtypeCands = dtypeCands[dtypeCands.index(dtype.type) :]
+
+    for dtypeCand in dtypeCands:
+        try:
+            return _csvColParse(col, dtypeCand)
+        except (ValueError, OverflowError):
+            pass
+    return np.array(col)
+
+
+def _csvColParse(col, dtype):
+    """
+    Parse a csv column of strings to the given type.
+
+    Numbers are parsed in C by np.fromstring on the joined column, which
+    is much faster than astype. fromstring stops silently at the first
+    character it can not read: inside the column this drops the rest and
+    is caught by the length, in the last field ('20x', or '3.75' as int)
+    it is caught by parsing that field again in Python. Integers it
+    clamped to the int64 range go through astype as well.
+
+    Input
+      col    -  column, n x (tuple of strings)
+      dtype  -  type
+
+    Output
+      A      -  array, n x, raises ValueError or OverflowError if not
+                parsable
+    """
+    import numpy as np
+    import warnings
+
+    kind = np.dtype(dtype).kind
+    if kind in 'iuf' and len(col) > 0:
+        # a field holding the separator would shift the values
+        txt = ','.join(col)
+        if txt.count(',') == len(col) - 1:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                A = np.fromstring(txt, dtype=dtype, sep=',')
+            if len(A) == len(col) and _csvLastOk(A, col[-1], kind):
+                return A
+
+    return np.array(col).astype(dtype)
+
+
+def _csvLastOk(A, txt, kind):
+    """
+    Check the fromstring result of a column against its last field.
+
+    Input
+      A     -  parsed column, n x
+      txt   -  last field
+      kind  -  dtype kind, 'i' | 'u' | 'f'
+
+    Output
+      isOk  -  True | False
+    """
+    import numpy as np
+
+    try:
+        val = float(txt) if kind == 'f' else int(txt)
+    except (ValueError, OverflowError):
+        return False
+
+    if kind == 'f':
+        return val == A[-1] or (np.isnan(val) and np.isnan(A[-1]))
+
+    # out-of-range fields are clamped
+    info = np.iinfo(A.dtype)
+    isClamp = (A == info.max).any() or (kind == 'i' and (A == info.min).any())
+    return val == A[-1] and not isClamp
+
+
+def _csvColStr(csvPath, nLnSkip, delimiter, quotechar, keySels):
+    """
+    Read some csv columns again as raw strings.
+
+    Input
+      csvPath    -  csv path
+      nLnSkip    -  #line to skip in the header
+      delimiter  -  delimiter
+      quotechar  -  quotechar
+      keySels    -  keys to read, m x
+
+    Output
+      cols       -  columns, key -> string array
+    """
+    import itertools
+    import numpy as np
+
+    if len(keySels) == 0:
+        return {}
+
+    with open(csvPath, 'rb') as csvfile:
+        csvHa = csv.reader(csvfile, delimiter=delimiter, quotechar=quotechar)
+        for row in itertools.islice(csvHa, nLnSkip):
+            pass
+        keys = next(csvHa, [])
+        idx = [keys.index(key) for key in keySels]
+        vals = [[] for key in keySels]
+        for row in csvHa:
+            for val, i in zip(vals, idx):
+                val.append(row[i])
+
+    return dict((key, np.array(val)) for key, val in zip(keySels, vals))
+
+
+def lmdbRIn(lmdbPath, nPre=0, nBatPre=256, isPool=False):
+    """
+    Get the lmdb handle of a given sequence.
+
+    Input
+      lmdbPath  -  path of the lmdb file
+      nPre      -  #batches prefetched by a background thread, {0} | 8 | ...
+                     0: read in the calling thread
+      nBatPre   -  #records per prefetched batch, {256} | ...
+      isPool    -  flag of reusing the environment from the process-wide
+                    handle pool, True | {False}, see haPoolSet
+
+    Output
+      ha        -  handles
+    """
+    import lmdb
+
+    # path file
+    if isPool:
+        env = _poolGet('lmdb', lmdbPath, lmdb.open)
+    else:
+        env = lmdb.open(lmdbPath)
+    txn = env.begin()
+    cur = txn.cursor()
+
+    # store
+    ha = {'env': env,
+          'txn': txn,
+          'cur': cur,
+          'co': 0,
+          'lmdb': lmdbPath,
+          'isPool': isPool}
+
+    # prefetch
+    if nPre > 0:
+        ha['que'] = queue.Queue(maxsize=nPre)
+        ha['stop'] = threading.Event()
+        ha['keys'] = []
+        ha['vals'] = []
+        ha['isEnd'] = False
+        ha['th'] = threading.Thread(target=_lmdbPreRun,
+                                    args=(env, ha['que'], ha['stop'], nBatPre))
+        ha['th'].daemon = True
+        ha['th'].start()
+
+    return ha
+
+
+def lmdbR(ha):
+    """
+    Read one item from lmdb handle.
+
+    Input
+      ha   -  handles
+
+    Output
+      key  -  key, None at the end
+      val  -  value, None at the end
+    """
+    if 'que' in ha:
+        keys, vals = lmdbRBat(ha, 1)
+        if len(keys) == 0:
+            return None, None
+        return keys[0], vals[0]
+
+    # move cursor
+    if ha['co'] == 0:
+        if not ha['cur'].first():
+            return None, None
+    else:
+        if not ha['cur'].next():
+            return None, None
+    ha['co'] += 1
+
+    # get key & value
+    key = ha['cur'].key()
+    val = ha['cur'].value()
+
+    return key, val
+
+
+def lmdbRBat(ha, nBat):
+    """
+    Read a batch of items from lmdb handle.
+
+    Input
+      ha    -  handles
+      nBat  -  #items
+
+    Output
+      keys  -  keys, nBat x (list), shorter or empty at the end
+      vals  -  values, nBat x (list)
+    """
+    if 'que' not in ha:
+        keys, vals = _lmdbCurBat(ha['cur'], ha['co'] == 0, nBat)
+        ha['co'] += len(keys)
+        return keys, vals
+
+    # gather prefetched batches
+    keys = ha['keys']
+    vals = ha['vals']
+    while len(keys) < nBat and not ha['isEnd']:
+        bat = ha['que'].get()
+        if bat is None:
+            ha['isEnd'] = True
+            break
+        if isinstance(bat, Exception):
+            ha['isEnd'] = True
+            raise bat
+        keys.extend(bat[0])
+        vals.extend(bat[1])
+    ha['keys'] = keys[nBat:]
+    ha['vals'] = vals[nBat:]
+    ha['co'] += min(nBat, len(keys))
+
+    return keys[:nBat], vals[:nBat]
+
+
+def lmdbROut(ha):
+    """
+    Close the handler.
+
+    Input
+      ha  -  handle
+    """
+    if 'th' in ha:
+        ha['stop'].set()
+        ha['th'].join()
+
+    if ha.get('isPool', False):
+        # end the read transaction, keep the environment open
+        ha['txn'].abort()
+        _poolPut('lmdb', ha['lmdb'])
+    else:
+        ha['env'].close()
+
+
+def lmdbWIn(lmdbPath, mapSiz=1 << 30, nBat=10000):
+    """
+    Get the lmdb handle for writing.
+
+    Puts are buffered and committed nBat at a time in one transaction.
+
+    Input
+      lmdbPath  -  path of the lmdb file
+      mapSiz    -  initial map size in bytes, doubled whenever full,
+                   {1 << 30} | ...
+      nBat      -  #items per transaction, {10000} | ...
+
+    Output
+      ha        -  handles
+    """
+    import lmdb
+
+    env = lmdb.open(lmdbPath, map_size=mapSiz)
+
+    # store
+    ha = {'env': env,
+          'items': [],
+          'nBat': nBat,
+          'co': 0,
+          'lmdb': lmdbPath}
+    return ha
+
+
+def lmdbW(ha, key, val):
+    """
+    Write one item to lmdb handle.
+
+    Input
+      ha   -  handles
+      key  -  key, bytes
+      val  -  value, bytes
+    """
+    ha['items'].append((key, val))
+    if len(ha['items']) >= ha['nBat']:
+        _lmdbFlush(ha)
+
+
+def lmdbWBat(ha, items):
+    """
+    Write many items to lmdb handle.
+
+    Input
+      ha     -  handles
+      items  -  (key, value) pairs, any iterable (list, generator, ...)
+    """
+    import itertools
+
+    it = iter(items)
+    while True:
+        nNew = ha['nBat'] - len(ha['items'])
+        bat = list(itertools.islice(it, nNew))
+        ha['items'].extend(bat)
+        if len(bat) < nNew:
+            break
+        _lmdbFlush(ha)
+
+
+def lmdbWOut(ha):
+    """
+    Commit the pending items and close the handler.
+
+    Input
+      ha  -  handle
+    """
+    _lmdbFlush(ha)
+    ha['env'].close()
+
+
+def _lmdbFlush(ha):
+    """
+    Commit the buffered items in one transaction, growing the map if full.
+
+    Input
+      ha  -  handles
+    """
+    import lmdb
+
+    items = ha['items']
+    if len(items) == 0:
+        return
+
+    env = ha['env']
+    while True:
+        try:
+            with env.begin(write=True) as txn:
+                cur = txn.cursor()
+                if hasattr(cur, 'putmulti'):
+                    cur.putmulti(items)
+                else:
+                    for key, val in items:
+                        txn.put(key, val)
+            break
+        except lmdb.MapFullError:
+            # the transaction is aborted, retry with a larger map
+            env.set_mapsize(env.info()['map_size'] * 2)
+
+    ha['co'] += len(items)
+    ha['items'] = []
+
+
+def _lmdbCurBat(cur, isFirst, nBat):
+    """
+    Advance a cursor and read the next batch of items.
+
+    The cursor is left on the last item read, as in lmdbR.
+
+    Input
+      cur      -  lmdb cursor
+      isFirst  -  flag of starting from the first item, True | False
+      nBat     -  #items
+
+    Output
+      keys     -  keys, nBat x (list)
+      vals     -  values, nBat x (list)
+    """
+    import itertools
+
+    if not (cur.first() if isFirst else cur.next()):
+        return [], []
+
+    keys = []
+    vals = []
+    for key, val in itertools.islice(cur.iternext(), nBat):
+        keys.append(key)
+        vals.append(val)
+    return keys, vals
+
+
+def _lmdbPreRun(env, que, stop, nBat):
+    """
+    Prefetch thread, puts (keys, vals) batches into the queue and None
+    at the end, or the exception raised while reading.
+
+    Input
+      env   -  lmdb environment
+      que   -  bounded queue
+      stop  -  event to stop the thread
+      nBat  -  #items per batch
+    """
+    try:
+        with env.begin() as txn:
+            cur = txn.cursor()
+            isFirst = True
+            bat = True
+            while bat is not None and not stop.is_set():
+                keys, vals = _lmdbCurBat(cur, isFirst, nBat)
+                isFirst = False
+                bat = (keys, vals) if len(keys) > 0 else None
+                _lmdbPrePut(que, stop, bat)
+    except Exception as e:
+        # hand the error to the reader instead of leaving it blocked
+        _lmdbPrePut(que, stop, e)
+
+
+def _lmdbPrePut(que, stop, bat):
+    """
+    Put a batch into the prefetch queue, waiting for room.
+
+    Input
+      que   -  bounded queue
+      stop  -  event to stop the thread
+      bat   -  batch, (keys, vals) | None | exception
+    """
+    while not stop.is_set():
+        try:
+            que.put(bat, timeout=0.1)
+            break
+        except queue.Full:
+            pass
+
+
+def recWIn(recPath, shardSiz=1 << 28):
+    """
+    Get the handle for writing a sharded record file.
+
+    The records go to fixed-size shard files under the recPath folder,
+    each record being length-prefixed (key, value, label). The index of
+    the keys is written by recWOut.
+
+    Input
+      recPath   -  path of the record folder
+      shardSiz  -  maximum size of a shard in bytes, {1 << 28} | ...
+
+    Output
+      ha        -  handles
+    """
+    if not os.path.exists(recPath):
+        os.makedirs(recPath)
+
+    # store
+    ha = {'rec': recPath,
+          'shardSiz': shardSiz,
+          'iShard': -1,
+          'fo': None,
+          'pos': 0,
+          'keys': [],
+          'shards': [],
+          'offs': [],
+          'nVals': [],
+          'labels': [],
+          'co': 0}
+    return ha
+
+
+def recW(ha, key, val, label=0):
+    """
+    Write one record.
+
+    Input
+      ha     -  handles
+      key    -  key, bytes | str, unique and not ending with '\\0'
+      val    -  value, bytes, e.g. the content of a jpeg file
+      label  -  label, int, {0} | ...
+    """
+    import struct
+
+    key = _recKey(key)
+    if key.endswith(b'\x00'):
+        raise Exception('key ends with \\0: {}'.format(key))
+
+    # start a new shard when full
+    nRec = _recHeadSiz + len(key) + len(val)
+    if ha['fo'] is None or (ha['pos'] > len(_recMagic) and
+                            ha['pos'] + nRec > ha['shardSiz']):
+        if ha['fo'] is not None:
+            ha['fo'].close()
+        ha['iShard'] += 1
+        ha['fo'] = open(_recShardPath(ha['rec'], ha['iShard']), 'wb')
+        ha['fo'].write(_recMagic)
+        ha['pos'] = len(_recMagic)
+
+    fo = ha['fo']
+    fo.write(struct.pack(_recHeadFmt, len(key), len(val), label))
+    fo.write(key)
+    fo.write(val)
+
+    # index
+    ha['keys'].append(key)
+    ha['shards'].append(ha['iShard'])
+    ha['offs'].append(ha['pos'] + _recHeadSiz + len(key))
+    ha['nVals'].append(len(val))
+    ha['labels'].append(label)
+    ha['pos'] += nRec
+    ha['co'] += 1
 
 
-def lmdbRIn(lmdbPath):
+def recWOut(ha):
     """
-    Get the lmdb handle of a given sequence.
+    Write the index and close the handler.
 
     Input
-      lmdbPath  -  path of the lmdb file
+      ha  -  handle
+    """
+    import numpy as np
 
-    Output
-      ha        -  handles
+    if ha['fo'] is not None:
+        ha['fo'].close()
+        ha['fo'] = None
+
+    # sorted keys for binary search
+    keys = np.array(ha['keys'], dtype=np.bytes_)
+    idx = np.argsort(keys, kind='mergesort')
+    keys = keys[idx]
+    if len(keys) > 1 and (keys[1:] == keys[:-1]).any():
+        iDup = np.nonzero(keys[1:] == keys[:-1])[0][0]
+        raise Exception('duplicated key: {}'.format(keys[iDup]))
+
+    Idx = {'keys': keys,
+           'shards': np.array(ha['shards'], dtype=np.uint32)[idx],
+           'offs': np.array(ha['offs'], dtype=np.uint64)[idx],
+           'nVals': np.array(ha['nVals'], dtype=np.uint64)[idx],
+           'labels': np.array(ha['labels'], dtype=np.int64)[idx],
+           'nShard': ha['iShard'] + 1}
+    save(os.path.join(ha['rec'], 'index'), Idx, type='np')
+
+
+def recRIn(recPath, shards=None, bufSiz=1 << 22):
     """
-    import lmdb
+    Get the handle for reading a sharded record file.
 
-    # path file
-    env = lmdb.open(lmdbPath)
-    txn = env.begin()
-    cur = txn.cursor()
+    The records are streamed shard by shard with large sequential reads
+    (recR, recRBat) or looked up by key through the index (recGet).
+
+    Input
+      recPath  -  path of the record folder
+      shards   -  shards to stream, {None} | list
+                    None: all shards
+      bufSiz   -  read buffer size in bytes, {1 << 22} | ...
 
+    Output
+      ha       -  handles
+    """
     # store
-    ha = {'env': env,
-          'cur': cur,
-          'co': 0,
-          'lmdb': lmdbPath}
+    ha = {'rec': recPath,
+          'shards': shards,
+          'bufSiz': bufSiz,
+          'iShard': -1,
+          'fo': None,
+          'idx': None,
+          'fos': {},
+          'co': 0}
     return ha
 
 
-def lmdbR(ha):
+def recR(ha):
     """
-    Read one item from lmdb handle.
+    Read the next record.
 
     Input
-      ha   -  handles
+      ha     -  handles
 
     Output
-      key  -  key
-      val  -  value
+      key    -  key, bytes, None at the end
+      val    -  value, bytes, None at the end
+      label  -  label, None at the end
     """
-    # move cursor
-    if ha['co'] == 0:
-        ha['cur'].first()
-    else:
-        if not ha['cur'].next():
+    import struct
+
+    while True:
+        if ha['fo'] is not None:
+            head = ha['fo'].read(_recHeadSiz)
+            if len(head) == _recHeadSiz:
+                break
+            ha['fo'].close()
+            ha['fo'] = None
+
+        # next shard
+        if ha['shards'] is None:
+            nShard = _recIdx(ha)['nShard']
+            ha['shards'] = list(range(nShard))
+        ha['iShard'] += 1
+        if ha['iShard'] >= len(ha['shards']):
             return None, None, None
+        ha['fo'] = open(_recShardPath(ha['rec'], ha['shards'][ha['iShard']]),
+                        'rb', ha['bufSiz'])
+        if ha['fo'].read(len(_recMagic)) != _recMagic:
+            raise Exception('not a record shard: {}'.format(ha['fo'].name))
+
+    nKey, nVal, label = struct.unpack(_recHeadFmt, head)
+    key = ha['fo'].read(nKey)
+    val = ha['fo'].read(nVal)
     ha['co'] += 1
 
-    # get key & value
-    key = ha['cur'].key()
-    val = ha['cur'].value()
+    return key, val, label
 
-    return key, val
 
+def recRBat(ha, nBat):
+    """
+    Read a batch of records.
 
-def lmdbROut(ha):
+    Input
+      ha      -  handles
+      nBat    -  #records
+
+    Output
+      keys    -  keys, nBat x (list), shorter or empty at the end
+      vals    -  values, nBat x (list)
+      labels  -  labels, nBat x (list)
+    """
+    keys = []
+    vals = []
+    labels = []
+    for i in range(nBat):
+        key, val, label = recR(ha)
+        if key is None:
+            break
+        keys.append(key)
+        vals.append(val)
+        labels.append(label)
+
+    return keys, vals, labels
+
+
+def recGet(ha, key):
+    """
+    Read the record of a key through the index.
+
+    Input
+      ha     -  handles
+      key    -  key, bytes | str
+
+    Output
+      val    -  value, bytes, None if missing
+      label  -  label, None if missing
+    """
+    import numpy as np
+
+    Idx = _recIdx(ha)
+    key = _recKey(key)
+
+    # binary search
+    keys = Idx['keys']
+    i = np.searchsorted(keys, key)
+    if i == len(keys) or keys[i] != key:
+        return None, None
+
+    iShard = int(Idx['shards'][i])
+    if iShard not in ha['fos']:
+        ha['fos'][iShard] = open(_recShardPath(ha['rec'], iShard), 'rb', 0)
+    fo = ha['fos'][iShard]
+    fo.seek(int(Idx['offs'][i]))
+    val = fo.read(int(Idx['nVals'][i]))
+
+    return val, int(Idx['labels'][i])
+
+
+def recROut(ha):
     """
     Close the handler.
 
     Input
       ha  -  handle
     """
-    ha['env'].close()
+    if ha['fo'] is not None:
+        ha['fo'].close()
+        ha['fo'] = None
+    for fo in ha['fos'].values():
+        fo.close()
+    ha['fos'] = {}
+
+
+# header of each shard
+_recMagic = b'FIOREC\x00\x01'
+
+# record head: #bytes of key, #bytes of value, label
+_recHeadFmt = '<IIq'
+_recHeadSiz = 16
+
+
+def _recShardPath(recPath, iShard):
+    """
+    Path of a shard.
+
+    Input
+      recPath  -  path of the record folder
+      iShard   -  shard id
+
+    Output
+      path     -  shard path
+    """
+    return os.path.join(recPath, 'shard-{:05d}'.format(iShard))
+
+
+def _recIdx(ha):
+    """
+    Get the index of a record handle, memory-mapped at the first call.
+
+    Input
+      ha   -  handles
+
+    Output
+      Idx  -  index
+    """
+    if ha['idx'] is None:
+        ha['idx'] = load(os.path.join(ha['rec'], 'index'), mmapMode='r')
+    return ha['idx']
+
+
+def _recKey(key):
+    """
+    Encode a key to bytes.
+
+    Input
+      key  -  key, bytes | str
+
+    Output
+      key  -  key, bytes
+    """
+    if not isinstance(key, bytes):
+        key = key.encode('utf8')
+    return key
 
 
-def hdfRIn(hdfPath):
+def hdfRIn(hdfPath, isPool=False):
     """
     Open an hdf handler.
 
     Input
       hdfPath  -  hdf path
+      isPool   -  flag of reusing the file from the process-wide handle
+                  pool, True | {False}, see haPoolSet
 
     Output
       ha       -  handler
     """
     import h5py
-    ha = h5py.File(hdfPath, 'r')
+    if isPool:
+        ha = _poolGet('hdf', hdfPath, lambda path: h5py.File(path, 'r'))
+    else:
+        ha = h5py.File(hdfPath, 'r')
 
     return ha
 
 
-def hdfR(ha, nm='a'):
+def hdfR(ha, nm='a', idx=None):
     """
     Read from hdf handler.
 
     Input
-      ha  -  hdf handler
-      nm  -  name, {'a'}
+      ha   -  hdf handler
+      nm   -  name, {'a'}
+      idx  -  rows to read, {None} | ..., see loadH5
 
     Output
-      A   -  result
+      A    -  result
     """
     A0 = ha[nm]
 
     import numpy as np
-    A = np.array(A0)
+    A = np.array(_h5Take(A0, idx))
 
     return A
 
 
+def hdfRLazy(ha, nm='a'):
+    """
+    Get a lazy view of a variable in a hdf handler.
+
+    Indexing the view reads only the selected hyperslab. Row lists are
+    sorted and merged into a few contiguous reads.
+
+    Input
+      ha  -  hdf handler
+      nm  -  name, {'a'}
+
+    Output
+      A   -  lazy array, supports shape, dtype, len() and A[idx]
+    """
+    return _H5Lazy(ha[nm])
+
+
+class _H5Lazy(object):
+    """
+    Array proxy over a h5py dataset.
+    """
+
+    def __init__(self, ds):
+        self.ds = ds
+        self.shape = ds.shape
+        self.dtype = ds.dtype
+        self.ndim = len(ds.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        # rows first, then the other dimensions in memory
+        if isinstance(key, tuple) and len(key) > 0 and _isRowLst(key[0]):
+            return _h5Take(self.ds, key[0])[(slice(None),) + key[1:]]
+        return _h5Take(self.ds, key)
+
+    def __array__(self, dtype=None):
+        import numpy as np
+        return np.asarray(_h5Take(self.ds, None), dtype=dtype)
+
+
+def _isRowLst(idx):
+    """
+    Check whether an index is a list of rows rather than a hyperslab.
+
+    Input
+      idx   -  index
+
+    Output
+      flag  -  True | False
+    """
+    import numpy as np
+
+    return isinstance(idx, (list, np.ndarray)) and np.ndim(idx) == 1
+
+
+def _h5Take(ds, idx, gapByte=1 << 16):
+    """
+    Read a selection from a h5py dataset.
+
+    Sorted row lists are merged into runs; rows closer than gapByte are
+    read together with the gap, which is cheaper than another read.
+
+    Input
+      ds       -  h5py dataset
+      idx      -  selection, see loadH5
+      gapByte  -  maximum #bytes of a gap inside one read, {1 << 16} | ...
+
+    Output
+      A        -  array
+    """
+    import numpy as np
+
+    if idx is None:
+        return ds[()]
+    if not _isRowLst(idx):
+        return ds[idx]
+
+    # row indices
+    n = ds.shape[0]
+    idx = np.asarray(idx)
+    if idx.dtype == np.bool_:
+        if len(idx) != n:
+            raise IndexError('boolean mask of {} rows for {} rows'.format(
+                len(idx), n))
+        idx = np.flatnonzero(idx)
+    if idx.size == 0:
+        # np.asarray([]) is float
+        idx = idx.astype(np.int64)
+    if idx.dtype.kind not in 'iu':
+        raise IndexError('row indices must be integers: {}'.format(idx.dtype))
+    idx = np.where(idx < 0, idx + n, idx).astype(np.int64)
+    if len(idx) > 0 and (idx.min() < 0 or idx.max() >= n):
+        raise IndexError('row index out of range: {}'.format(n))
+    rows, inv = np.unique(idx, return_inverse=True)
+    if len(rows) == 0:
+        return np.empty((0,) + ds.shape[1:], dtype=ds.dtype)
+
+    # split the sorted rows into runs
+    nByteRow = int(np.prod(ds.shape[1:])) * ds.dtype.itemsize
+    nGapMa = gapByte // max(1, nByteRow)
+    cuts = np.flatnonzero(np.diff(rows) - 1 > nGapMa) + 1
+    heads = np.concatenate([[0], cuts]).astype(np.int64)
+    ends = np.concatenate([cuts, [len(rows)]]).astype(np.int64)
+
+    A = np.empty((len(rows),) + ds.shape[1:], dtype=ds.dtype)
+    for hd, ed in zip(heads, ends):
+        lo = rows[hd]
+        hi = rows[ed - 1] + 1
+        if hi - lo == ed - hd:
+            # dense run, straight into the output
+            ds.read_direct(A, np.s_[lo:hi], np.s_[hd:ed])
+        else:
+            A[hd:ed] = ds[lo:hi][rows[hd:ed] - lo]
+
+    # back to the requested order, duplicates included
+    if len(rows) == len(idx) and np.all(rows == idx):
+        return A
+    return A[inv]
+
+
 def hdfROut(ha):
     """
     Close a HDF handler.
@@ -503,4 +2733,286 @@ def hdfROut(ha):
     Input
       ha  -  hdf handler
     """
+    if not _poolPutHa(ha):
+        ha.close()
+
+
+def haPoolSet(nMa):
+    """
+    Set the maximum #handles kept open by the handle pool.
+
+    The pool is shared by hdfRIn(isPool=True) and lmdbRIn(isPool=True).
+    Handles released by hdfROut / lmdbROut stay open for the next call
+    on the same path; beyond nMa, the least recently used released
+    handles are closed. After a fork, the child reopens its own handles.
+
+    Input
+      nMa  -  maximum #handles, {64} | ...
+    """
+    global _poolMa
+
+    with _poolLock:
+        _poolCheckFork()
+        _poolMa = nMa
+        _poolEvict()
+
+
+def haPoolClr():
+    """
+    Close all the released handles in the pool.
+    """
+    with _poolLock:
+        _poolCheckFork()
+        for key in list(_pool.keys()):
+            if _pool[key][1] == 0:
+                _poolDel(key)
+
+
+# handle pool, (kind, path) -> [handle, #users], least recently used first
+_pool = None
+_poolMa = 64
+_poolPid = None
+_poolZombies = []
+_poolLock = threading.Lock()
+
+
+def _poolCheckFork():
+    """
+    Drop the handles inherited from the parent process.
+
+    They are kept referenced but never used or closed in the child;
+    closing an lmdb environment there would release the parent's locks.
+    """
+    global _pool, _poolPid
+    from collections import OrderedDict
+
+    if _poolPid == os.getpid():
+        return
+    if _pool is not None:
+        _poolZombies.extend(item[0] for item in _pool.values())
+    _pool = OrderedDict()
+    _poolPid = os.getpid()
+
+
+def _poolGet(kind, path, openFunc):
+    """
+    Get a handle from the pool, opening it if needed.
+
+    Input
+      kind      -  handle kind, 'hdf' | 'lmdb'
+      path      -  path
+      openFunc  -  function opening the path
+
+    Output
+      ha        -  handle
+    """
+    key = (kind, os.path.abspath(path))
+    with _poolLock:
+        _poolCheckFork()
+        if key in _pool:
+            # most recently used last
+            item = _pool.pop(key)
+        else:
+            item = [openFunc(path), 0]
+        item[1] += 1
+        _pool[key] = item
+        _poolEvict()
+        return item[0]
+
+
+def _poolPut(kind, path):
+    """
+    Release a handle got by _poolGet.
+
+    Input
+      kind  -  handle kind, 'hdf' | 'lmdb'
+      path  -  path
+    """
+    key = (kind, os.path.abspath(path))
+    with _poolLock:
+        _poolCheckFork()
+        if key in _pool:
+            _pool[key][1] -= 1
+            _poolEvict()
+
+
+def _poolPutHa(ha):
+    """
+    Release a pooled hdf handle.
+
+    Input
+      ha    -  hdf handler
+
+    Output
+      isIn  -  False if the handle is not from the pool
+    """
+    if _pool is None:
+        return False
+    with _poolLock:
+        _poolCheckFork()
+        for key, item in _pool.items():
+            if item[0] is ha:
+                item[1] -= 1
+                _poolEvict()
+                return True
+    return False
+
+
+def _poolEvict():
+    """
+    Close the least recently used released handles beyond the maximum.
+    Handles in use are never closed.
+    """
+    nDel = len(_pool) - _poolMa
+    for key in list(_pool.keys()):
+        if nDel <= 0:
+            break
+        if _pool[key][1] == 0:
+            _poolDel(key)
+            nDel -= 1
+
+
+def _poolDel(key):
+    """
+    Close and remove a handle of the pool.
+
+    Input
+      key  -  pool key
+    """
+    ha, _ = _pool.pop(key)
     ha.close()
+
+
+def loadAio(filename, **kwargs):
+    """
+    Awaitable load, run on the fio thread pool, see aioPoolSet.
+
+    Input
+      filename  -  filename
+      kwargs    -  other arguments of load
+
+    Output
+      fut       -  awaitable of data
+    """
+    return _aioRun(load, filename, **kwargs)
+
+
+def loadH5Aio(filename, varNm, **kwargs):
+    """
+    Awaitable loadH5, run on the fio thread pool.
+
+    Input
+      filename  -  filename
+      varNm     -  variable name
+      kwargs    -  other arguments of loadH5
+
+    Output
+      fut       -  awaitable of data
+    """
+    return _aioRun(loadH5, filename, varNm, **kwargs)
+
+
+def loadLnsAio(inpath):
+    """
+    Awaitable loadLns, run on the fio thread pool.
+
+    Input
+      inpath  -  input path, string
+
+    Output
+      fut     -  awaitable of lines
+    """
+    return _aioRun(loadLns, inpath)
+
+
+def saveAio(filepath, data, **kwargs):
+    """
+    Awaitable save, run on the fio thread pool.
+
+    Input
+      filepath  -  file name
+      data      -  data
+      kwargs    -  other arguments of save
+
+    Output
+      fut       -  awaitable of None
+    """
+    return _aioRun(save, filepath, data, **kwargs)
+
+
+def loadManyAio(paths, func=None, nCon=8, **kwargs):
+    """
+    Awaitable load of many files, at most nCon at a time.
+
+    The files are read on a thread pool of nCon threads of its own, so
+    a large batch neither starves the shared pool nor blocks the loop.
+
+    Input
+      paths   -  paths, n x (list)
+      func    -  load function, {load} | loadH5 | loadLns | ...
+      nCon    -  maximum #files read at the same time, {8} | ...
+      kwargs  -  other arguments of func
+
+    Output
+      fut     -  awaitable of the results, n x (list), in input order
+    """
+    import asyncio
+    import functools
+    from concurrent.futures import ThreadPoolExecutor
+
+    func = load if func is None else func
+    loop = asyncio.get_event_loop()
+    pool = ThreadPoolExecutor(max_workers=nCon)
+    futs = [loop.run_in_executor(pool, functools.partial(func, path, **kwargs))
+            for path in paths]
+    fut = asyncio.gather(*futs)
+    fut.add_done_callback(lambda _: pool.shutdown(wait=False))
+    return fut
+
+
+def aioPoolSet(nThd):
+    """
+    Set the #threads of the pool running loadAio, saveAio, ...
+
+    Input
+      nThd  -  #threads, {8} | ...
+    """
+    global _aioPool, _aioNThd
+
+    with _aioLock:
+        if _aioPool is not None:
+            _aioPool.shutdown(wait=False)
+        _aioPool = None
+        _aioNThd = nThd
+
+
+# thread pool of the awaitable functions, created on first use
+_aioPool = None
+_aioNThd = 8
+_aioLock = threading.Lock()
+
+
+def _aioRun(func, *args, **kwargs):
+    """
+    Run a blocking function on the fio thread pool.
+
+    Input
+      func    -  function
+      args    -  arguments
+      kwargs  -  keyword arguments
+
+    Output
+      fut     -  awaitable of the result
+    """
+    global _aioPool
+    import asyncio
+    import functools
+    from concurrent.futures import ThreadPoolExecutor
+
+    with _aioLock:
+        if _aioPool is None:
+            _aioPool = ThreadPoolExecutor(max_workers=_aioNThd)
+        pool = _aioPool
+
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(pool, functools.partial(func, *args, **kwargs))
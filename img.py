@@ -7,9 +7,12 @@ History
 """
 from pri import pr
 from cell import cells
+import os
+import threading
 import skimage.io
 import PIL
 import numpy as np
+from collections import OrderedDict
 
 
 def imgCrop(img0, box, isOkOut=False):
@@ -86,30 +89,11 @@ def imgCropSca(img0, h=120, w=90):
     Output
       img   -  cropped image, h x w x 3
     """
-    # dimension
-    h0, w0, nChan = img0.shape
-
     # get the bounding box
-    if 1.0 * w0 / h0 > 1.0 * w / h:
-        # crop w
-        h1 = h0
-        w1 = int(1.0 * w * h1 / h)
-        xMi = (w0 - w1) / 2
-        xMa = xMi + w1 - 1
-        yMi = 0
-        yMa = h0 - 1
-    else:
-        # crop h
-        w1 = w0
-        h1 = int(1.0 * h * w1 / w)
-        yMi = (h0 - h1) / 2
-        yMa = yMi + h1 - 1
-        xMi = 0
-        xMa = w0 - 1
+    box = _imgCropScaBox(np.array([img0.shape[:2]]), h, w)[0]
 
     # crop
-    box = [[yMi, yMa], [xMi, xMa]]
-    img = imgCrop(img0, np.array(box), isOkOut=True)
+    img = imgCrop(img0, box, isOkOut=True)
 
     # scale
     img = imgSizNew(img, [h, w])
@@ -117,6 +101,89 @@ def imgCropSca(img0, h=120, w=90):
     return img
 
 
+def imgCropScaBat(imgs, h=120, w=90, out=None, nThd=1, bk=None):
+    """
+    Crop and scale a batch of images, see imgCropSca.
+
+    Input
+      imgs  -  images, n x (list), h0 x w0 x nChan
+      h     -  height, {120} | ...
+      w     -  width, {90} | ...
+      out   -  preallocated output, {None} | n x h x w x nChan
+                 None: allocated as np.float32, or as the dtype of the
+                       images with a backend
+      nThd  -  #threads, {1} | ...
+      bk    -  resize backend, see imgSizNew, {None} | 'auto' | ...
+
+    Output
+      out   -  images, n x h x w x nChan
+    """
+    # dimension
+    n = len(imgs)
+    if out is None:
+        nChan = imgs[0].shape[2] if n > 0 else 3
+        dtype = np.float32 if bk is None or n == 0 else imgs[0].dtype
+        out = np.empty((n, h, w, nChan), dtype=dtype)
+
+    # all bounding boxes at once
+    Siz = np.array([img0.shape[:2] for img0 in imgs]).reshape((n, 2))
+    Box = _imgCropScaBox(Siz, h, w)
+
+    # the crop is a view, only the scaled image is written
+    def run(i):
+        img = imgCrop(imgs[i], Box[i], isOkOut=True)
+        if bk is None:
+            out[i] = imgSizNew(img, [h, w])
+        else:
+            imgRsz(img, [h, w], bk=bk, out=out[i])
+
+    if nThd > 1:
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(nThd)
+        try:
+            pool.map(run, range(n))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for i in range(n):
+            run(i)
+
+    return out
+
+
+def _imgCropScaBox(Siz, h, w):
+    """
+    Compute the center-crop boxes keeping the ratio of h x w.
+
+    Input
+      Siz  -  image sizes, n x 2
+      h    -  height
+      w    -  width
+
+    Output
+      Box  -  bounding boxes, n x 2 x 2, see imgCrop
+    """
+    h0 = Siz[:, 0]
+    w0 = Siz[:, 1]
+
+    # crop w if wider than h x w, otherwise crop h
+    isW = 1.0 * w0 / h0 > 1.0 * w / h
+    h1 = np.where(isW, h0, (1.0 * h * w0 / w).astype(int))
+    w1 = np.where(isW, (1.0 * w * h0 / h).astype(int), w0)
+    yMi = (h0 - h1) // 2
+    xMi = (w0 - w1) // 2
+
+    Box = np.empty((len(Siz), 2, 2), dtype=int)
+    Box[:, 0, 0] = yMi
+    Box[:, 0, 1] = yMi + h1 - 1
+    Box[:, 1, 0] = xMi
+    Box[:, 1, 1] = xMi + w1 - 1
+
+    return Box
+
+
 def imgMeans(Img):
     """
     Compute the mean image.
@@ -141,40 +208,169 @@ def imgMean(imgs):
     """
     Compute the mean image.
 
+    Smaller images are zero-padded to the largest size, see imgStatIn.
+
     Input
       imgs  -  a list of images, n x, h x w x 3
 
     Output
       img   -  mean image, h x w x 3
     """
-    # dimension
-    n = len(imgs)
-
-    # check the image size
-    Siz = np.zeros((n, 3), dtype=np.uint8)
-    for i in range(n):
-        Siz[i] = np.array(imgs[i].shape, dtype=np.uint8)
-    siz = Siz.max(axis=0)
-
-    img = np.zeros(tuple(siz))
-    for imgi in imgs:
-        sizi = imgi.shape
-        # pad
-        imgi = np.lib.pad(imgi,
-                          ((0, siz[0] - sizi[0]),
-                           (0, siz[1] - sizi[1]),
-                           (0, siz[2] - sizi[2])),
-                          'constant')
-
-        # resize
-        img += imgi
-
-    # average
-    img /= n
+    ha = imgStatIn()
+    imgStatAddBat(ha, imgs)
+    img, _ = imgStatOut(ha, dtype=np.float64)
     return img
 
 
-def imgSizNew(img0, siz, order=1):
+def imgStatIn():
+    """
+    Get the handle of a streaming mean / std accumulator (Welford).
+
+    Images are added one at a time or in batches, so the whole set never
+    has to fit in memory. Smaller images are zero-padded to the largest
+    size seen so far. Handles of different workers can be merged with
+    imgStatMerge, they are plain dicts and pickle across processes.
+
+    Output
+      ha  -  handle
+    """
+    ha = {'n': 0,
+          'mean': None,
+          'M2': None}
+    return ha
+
+
+def imgStatAdd(ha, img):
+    """
+    Add one image to the accumulator.
+
+    Input
+      ha   -  handle
+      img  -  image, h x w x nChan
+    """
+    _imgStatAcc(ha, np.asarray(img)[np.newaxis])
+
+
+def imgStatAddBat(ha, imgs):
+    """
+    Add a batch of images to the accumulator.
+
+    Input
+      ha    -  handle
+      imgs  -  images, n x h x w x nChan | n x (list)
+    """
+    if isinstance(imgs, np.ndarray):
+        _imgStatAcc(ha, imgs)
+        return
+
+    # a list of the same size is stacked, otherwise one by one
+    if len(set(img.shape for img in imgs)) == 1:
+        _imgStatAcc(ha, np.stack(imgs))
+    else:
+        for img in imgs:
+            imgStatAdd(ha, img)
+
+
+def imgStatMerge(ha, ha2):
+    """
+    Merge another accumulator into the handle.
+
+    Input
+      ha   -  handle, updated in place
+      ha2  -  handle
+    """
+    if ha2['n'] == 0:
+        return
+    _imgStatComb(ha, ha2['n'], ha2['mean'], ha2['M2'])
+
+
+def imgStatOut(ha, dtype=np.float32):
+    """
+    Get the mean and standard deviation of the added images.
+
+    Input
+      ha     -  handle
+      dtype  -  output type, {np.float32} | np.float64
+
+    Output
+      mean   -  mean image, h x w x nChan
+      std    -  standard deviation image, h x w x nChan
+    """
+    if ha['n'] == 0:
+        raise Exception('no image is added')
+
+    mean = ha['mean'].astype(dtype)
+    std = np.sqrt(ha['M2'] / ha['n']).astype(dtype)
+    return mean, std
+
+
+def _imgStatAcc(ha, Img):
+    """
+    Add a batch of same-size images to the accumulator.
+
+    Input
+      ha   -  handle
+      Img  -  images, m x h x w x nChan
+    """
+    m = len(Img)
+    if m == 0:
+        return
+
+    meanB = Img.mean(axis=0, dtype=np.float64)
+    M2B = np.zeros(meanB.shape)
+    for img in Img:
+        M2B += np.square(img - meanB)
+    _imgStatComb(ha, m, meanB, M2B)
+
+
+def _imgStatComb(ha, m, meanB, M2B):
+    """
+    Combine the statistics of another set into the handle (Chan et al.).
+
+    Input
+      ha     -  handle
+      m      -  #images of the set
+      meanB  -  mean of the set, h x w x nChan
+      M2B    -  sum of squared deviations of the set, h x w x nChan
+    """
+    # common size, zero padding
+    if ha['mean'] is None:
+        siz = meanB.shape
+    else:
+        siz = tuple(np.maximum(ha['mean'].shape, meanB.shape))
+    ha['mean'] = _imgStatPad(ha['mean'], siz)
+    ha['M2'] = _imgStatPad(ha['M2'], siz)
+    meanB = _imgStatPad(meanB, siz)
+    M2B = _imgStatPad(M2B, siz)
+
+    n = ha['n']
+    nNew = n + m
+    delta = meanB - ha['mean']
+    ha['mean'] += delta * (1.0 * m / nNew)
+    ha['M2'] += M2B + np.square(delta) * (1.0 * n * m / nNew)
+    ha['n'] = nNew
+
+
+def _imgStatPad(A, siz):
+    """
+    Zero-pad an array to a size.
+
+    Input
+      A    -  array, None for all zeros
+      siz  -  size
+
+    Output
+      A    -  array of size siz (np.float64)
+    """
+    if A is None:
+        return np.zeros(siz)
+    if A.shape == siz:
+        return A
+    return np.lib.pad(A, [(0, s - s0) for s, s0 in zip(siz, A.shape)],
+                      'constant')
+
+
+def imgSizNew(img0, siz, order=1, bk=None, out=None):
     """
     Resize an image.
 
@@ -182,10 +378,17 @@ def imgSizNew(img0, siz, order=1):
       img0   -  original image, h0 x w0 x nChan
       siz    -  size, h x w
       order  -  interpolation order, {1} | ...
+      bk     -  backend, {None} | 'auto' | 'cv2' | 'pil' | 'ski'
+                  None: normalized skimage resize, returns np.float32
+                  otherwise: see imgRsz, keeps the dtype
+      out    -  preallocated output of a backend, {None} | h x w x nChan
 
     Output
       img    -  new image, h x w x nChan
     """
+    if bk is not None:
+        return imgRsz(img0, siz, order=order, bk=bk, out=out)
+
     siz0 = img0.shape
     if siz0[-1] == 1 or siz0[-1] == 3:
         from skimage.transform import resize
@@ -206,6 +409,133 @@ def imgSizNew(img0, siz, order=1):
     return resized_im.astype(np.float32)
 
 
+def imgRsz(img0, siz, order=1, bk='auto', out=None):
+    """
+    Resize an image keeping its dtype, without normalization.
+
+    Backends
+      'cv2':  uint8, uint16, float32, float64, any #channels up to 512
+      'pil':  uint8 with 1, 3 or 4 channels, float32 with 1 channel,
+              filters over the whole footprint when shrinking
+      'ski':  anything, computed in float64
+
+    Input
+      img0   -  original image, h0 x w0 x nChan | h0 x w0
+      siz    -  size, h x w
+      order  -  interpolation order, 0 | {1} | ... | 5
+                  cv2 and PIL only take 0, 1 and 3
+      bk     -  backend, {'auto'} | 'cv2' | 'pil' | 'ski'
+                  'auto': the fastest one available for the dtype,
+                          #channels and order, in the order above
+      out    -  preallocated output, {None} | h x w x nChan
+
+    Output
+      img    -  new image, h x w x nChan, same dtype as img0
+    """
+    if bk == 'auto':
+        bk = _imgRszBk(img0, order)
+    elif bk in ('cv2', 'pil') and not _imgRszOk(bk, img0, order):
+        raise Exception('unsupported by {}: {} x {} channels, order {}'.format(
+            bk, img0.dtype, img0.shape[2] if img0.ndim == 3 else 1, order))
+    h, w = int(siz[0]), int(siz[1])
+
+    if bk == 'cv2':
+        import cv2
+
+        inter = {0: cv2.INTER_NEAREST,
+                 1: cv2.INTER_LINEAR,
+                 3: cv2.INTER_CUBIC}[order]
+        img = cv2.resize(img0, (w, h), interpolation=inter)
+
+    elif bk == 'pil':
+        from PIL import Image
+
+        resample = {0: Image.NEAREST,
+                    1: Image.BILINEAR,
+                    3: Image.BICUBIC}[order]
+        pix = img0[:, :, 0] if img0.ndim == 3 and img0.shape[2] == 1 else img0
+        im = Image.fromarray(np.ascontiguousarray(pix))
+        img = np.asarray(im.resize((w, h), resample))
+
+    elif bk == 'ski':
+        from skimage.transform import resize
+
+        img = resize(img0, (h, w), order=order, mode='reflect',
+                     preserve_range=True)
+        if img0.dtype.kind in 'ui':
+            info = np.iinfo(img0.dtype)
+            img = np.clip(np.rint(img), info.min, info.max)
+        img = img.astype(img0.dtype)
+
+    else:
+        raise Exception('unknown backend: {}'.format(bk))
+
+    # cv2 and PIL drop a single channel
+    if img.ndim < img0.ndim:
+        img = img[:, :, np.newaxis]
+
+    if out is not None:
+        out[...] = img
+        return out
+    return img
+
+
+# backends that can be imported, filled at the first call of imgRsz
+_imgBks = None
+
+
+def _imgRszBk(img0, order):
+    """
+    Pick the fastest backend available for an image.
+
+    Input
+      img0   -  image, h0 x w0 x nChan | h0 x w0
+      order  -  interpolation order
+
+    Output
+      bk     -  backend, 'cv2' | 'pil' | 'ski'
+    """
+    global _imgBks
+    if _imgBks is None:
+        _imgBks = set(['ski'])
+        for bk, mod in (('cv2', 'cv2'), ('pil', 'PIL.Image')):
+            try:
+                __import__(mod)
+                _imgBks.add(bk)
+            except ImportError:
+                pass
+
+    for bk in ('cv2', 'pil'):
+        if bk in _imgBks and _imgRszOk(bk, img0, order):
+            return bk
+    return 'ski'
+
+
+def _imgRszOk(bk, img0, order):
+    """
+    Check whether cv2 or PIL resizes an image keeping its dtype.
+
+    Input
+      bk     -  backend, 'cv2' | 'pil'
+      img0   -  image, h0 x w0 x nChan | h0 x w0
+      order  -  interpolation order
+
+    Output
+      isOk   -  True | False
+    """
+    # only skimage has the orders other than 0, 1 and 3
+    if order not in (0, 1, 3):
+        return False
+
+    nChan = img0.shape[2] if img0.ndim == 3 else 1
+    dtype = img0.dtype
+    if bk == 'cv2':
+        return nChan <= 512 and dtype in (np.uint8, np.uint16, np.float32,
+                                          np.float64)
+    return ((dtype == np.uint8 and nChan in (1, 3, 4)) or
+            (dtype == np.float32 and nChan == 1))
+
+
 def imgSizEqW(siz0, w):
     """
     Adjust the image size to fit with the width.
@@ -305,7 +635,7 @@ def imgSv(imgPath, img):
     """
     skimage.io.imsave(imgPath, img)
 
-def imgLoad(imgPath, color=True):
+def imgLoad(imgPath, color=True, siz=None, isCache=False):
     """
     Load an image converting from grayscale or alpha as needed.
 
@@ -313,6 +643,12 @@ def imgLoad(imgPath, color=True):
       imgPath  -  image path
       color    -  flag for color format. True (default) loads as RGB while False
                   loads as intensity (if image is already grayscale).
+      siz      -  target size, {None} | h x w
+                    None: full resolution
+                    h x w: jpegs are decoded at 1/2, 1/4 or 1/8 scale while
+                           staying at least h x w, the caller still resizes
+      isCache  -  flag of using the decoded-image cache, True | {False}
+                    True: the image is read-only, see imgCacheSet
 
     Output
       image    -  an image with type np.float32 in range [0, 1]
@@ -321,13 +657,222 @@ def imgLoad(imgPath, color=True):
     """
     # load
     try:
-        img0 = skimage.io.imread(imgPath)
-        img = skimage.img_as_float(img0).astype(np.float32)
-
-    except:
-        pr('unable to open img: {}'.format(imgPath))
+        img = _imgLoad(imgPath, color, siz, isCache)
+    except Exception as e:
+        pr('unable to open img: {}, {}'.format(imgPath, e))
         return None
 
+    return img
+
+def imgLoadBatch(imgPaths, color=True, nWork=8, mode='thread', out=None,
+                 siz=None, isCache=False):
+    """
+    Load a batch of images in parallel.
+
+    Input
+      imgPaths  -  image paths, n x
+      color     -  flag for color format, see imgLoad
+      nWork     -  #workers, {8} | ...
+      mode      -  parallel mode, {'thread'} | 'process'
+                     'thread': decoders releasing the GIL, no copy
+                     'process': each image is pickled back
+      out       -  preallocated output, {None} | n x h x w x nChan
+                     None: return a list of images
+      siz       -  target size of the jpeg decoding, see imgLoad
+      isCache   -  flag of using the decoded-image cache, True | {False},
+                   the cache is per process, shared only in 'thread' mode
+
+    Output
+      imgs      -  images in input order, n x (list, None if failed) | out
+      errs      -  error of each image, n x (list, None if ok)
+    """
+    from multiprocessing.pool import ThreadPool, Pool
+
+    # dimension
+    n = len(imgPaths)
+    imgs = [None] * n if out is None else out
+    errs = [None] * n
+
+    if mode == 'thread':
+        # the workers write into out directly
+        def run(i):
+            img, err = _imgLoadTry((imgPaths[i], color, siz, isCache))
+            if err is None and out is not None:
+                err = _imgPut(out, i, img)
+                img = None
+            return img, err
+
+        pool = ThreadPool(nWork)
+        func = run
+        args = range(n)
+    elif mode == 'process':
+        pool = Pool(nWork)
+        func = _imgLoadTry
+        args = [(imgPath, color, siz, isCache) for imgPath in imgPaths]
+    else:
+        raise Exception('unknown mode: {}'.format(mode))
+
+    try:
+        chunkSiz = max(1, n // (nWork * 4))
+        for i, (img, err) in enumerate(pool.imap(func, args, chunkSiz)):
+            if err is None and mode == 'process' and out is not None:
+                err = _imgPut(out, i, img)
+            elif err is None and out is None:
+                imgs[i] = img
+            errs[i] = err
+    finally:
+        pool.close()
+        pool.join()
+
+    return imgs, errs
+
+def imgCacheSet(nByteMa):
+    """
+    Set the memory budget of the decoded-image cache.
+
+    The cache is used by imgLoad(isCache=True) and imgLoadBatch. Images
+    are keyed on (path, mtime, file size, color, siz), so a modified
+    file is decoded again. Beyond nByteMa, the least recently used images
+    are dropped. Cached images are read-only and shared by all callers.
+
+    Input
+      nByteMa  -  maximum #bytes of the decoded images, {1 << 30} | ...
+    """
+    global _imgCacheMa
+
+    with _imgCacheLock:
+        _imgCacheMa = nByteMa
+        _imgCacheEvict()
+
+def imgCacheClr():
+    """
+    Drop all the images in the decoded-image cache and reset its counts.
+    """
+    global _imgCacheByte
+
+    with _imgCacheLock:
+        _imgCache.clear()
+        _imgCacheByte = 0
+        for key in _imgCacheCo:
+            _imgCacheCo[key] = 0
+
+def imgCacheStat():
+    """
+    Get the statistics of the decoded-image cache.
+
+    Output
+      stat  -  statistics, dict
+                 'hit', 'miss', 'evict': counts since the last imgCacheClr
+                 'n': #images, 'nByte': #bytes, 'nByteMa': budget
+    """
+    with _imgCacheLock:
+        stat = dict(_imgCacheCo)
+        stat['n'] = len(_imgCache)
+        stat['nByte'] = _imgCacheByte
+        stat['nByteMa'] = _imgCacheMa
+    return stat
+
+# decoded-image cache, key -> image, least recently used first
+_imgCache = OrderedDict()
+_imgCacheMa = 1 << 30
+_imgCacheByte = 0
+_imgCacheCo = {'hit': 0, 'miss': 0, 'evict': 0}
+_imgCacheLock = threading.Lock()
+
+def _imgCacheGet(key):
+    """
+    Get an image from the cache.
+
+    Input
+      key  -  cache key
+
+    Output
+      img  -  image, None if missing
+    """
+    with _imgCacheLock:
+        img = _imgCache.pop(key, None)
+        if img is None:
+            _imgCacheCo['miss'] += 1
+            return None
+
+        # most recently used last
+        _imgCache[key] = img
+        _imgCacheCo['hit'] += 1
+        return img
+
+def _imgCachePut(key, img):
+    """
+    Put an image into the cache.
+
+    Input
+      key  -  cache key
+      img  -  image, read-only
+    """
+    global _imgCacheByte
+
+    if img.nbytes > _imgCacheMa:
+        return
+    with _imgCacheLock:
+        if key in _imgCache:
+            return
+        _imgCache[key] = img
+        _imgCacheByte += img.nbytes
+        _imgCacheEvict()
+
+def _imgCacheEvict():
+    """
+    Drop the least recently used images beyond the budget.
+    """
+    global _imgCacheByte
+
+    while _imgCacheByte > _imgCacheMa and len(_imgCache) > 0:
+        _, img = _imgCache.popitem(last=False)
+        _imgCacheByte -= img.nbytes
+        _imgCacheCo['evict'] += 1
+
+def _imgLoad(imgPath, color, siz=None, isCache=False):
+    """
+    Load an image, see imgLoad, raising on failures.
+
+    Input
+      imgPath  -  image path
+      color    -  flag for color format
+      siz      -  target size, {None} | h x w
+      isCache  -  flag of using the decoded-image cache
+
+    Output
+      image    -  image, h x w x 3 | h x w x 1
+    """
+    if isCache:
+        st = os.stat(imgPath)
+        key = (os.path.abspath(imgPath), st.st_mtime, st.st_size, bool(color),
+               None if siz is None else tuple(siz))
+        img = _imgCacheGet(key)
+        if img is None:
+            # own buffer, e.g. not an RGB view of RGBA, so nbytes is what
+            # is held and the whole buffer is read-only
+            img = np.ascontiguousarray(_imgLoad(imgPath, color, siz))
+            if img.base is not None:
+                img = img.copy()
+            img.flags.writeable = False
+            _imgCachePut(key, img)
+        return img
+
+    img0 = None
+    if siz is not None:
+        from PIL import Image
+
+        # DCT scaling, only jpegs support it
+        im = Image.open(imgPath)
+        if im.format == 'JPEG':
+            im.draft(im.mode, (siz[1], siz[0]))
+            if im.mode not in ('L', 'RGB'):
+                im = im.convert('RGB')
+            img0 = np.asarray(im)
+    if img0 is None:
+        img0 = skimage.io.imread(imgPath)
+    img = skimage.img_as_float(img0).astype(np.float32)
+
     # color channel
     if img.ndim == 2:
         img = img[:, :, np.newaxis]
@@ -339,6 +884,39 @@ def imgLoad(imgPath, color=True):
 
     return img
 
+def _imgLoadTry(arg):
+    """
+    Load an image in a worker of imgLoadBatch.
+
+    Input
+      arg    -  (image path, color, target size, cache flag)
+
+    Output
+      image  -  image, None if failed
+      err    -  error message, None if ok
+    """
+    try:
+        return _imgLoad(arg[0], arg[1], arg[2], arg[3]), None
+    except Exception as e:
+        return None, '{}: {}'.format(e.__class__.__name__, e)
+
+def _imgPut(out, i, img):
+    """
+    Copy an image into a preallocated batch.
+
+    Input
+      out  -  batch, n x h x w x nChan
+      i    -  position
+      img  -  image, h x w x nChan
+
+    Output
+      err  -  error message, None if ok
+    """
+    if img.shape != out.shape[1:]:
+        return 'size {} vs {}'.format(img.shape, out.shape[1:])
+    out[i] = img
+    return None
+
 def imgLoadTxt(txtPaths):
     """
     Load image from txt file.
@@ -424,33 +1002,54 @@ def imgPil2Ski(im):
     Convert image from PIL format to an Skimage one.
 
     Input
-      img0   -  original PIL image
+      img0   -  original PIL image, grayscale is replicated to 3 channels
+                and alpha is dropped
 
     Output
-      image  -  new Ski image
+      image  -  new Ski image, h x w x 3 (np.float32)
     """
-    img0 = np.array(im.getdata())
-    if img0.shape[1] == 4:
-        pix = img0[:, 0 : 3].reshape(im.size[1], im.size[0], 3) / 255.0
-    elif img0.shape[1] == 3:
-        pix = img0.reshape(im.size[1], im.size[0], 3) / 255.0
-    im = skimage.img_as_float(pix).astype(np.float32)
+    # uint8 view of the PIL buffer, h x w | h x w x 3 | h x w x 4
+    pix = _imgPilArr(im)
+    if pix.ndim == 2:
+        pix = pix[:, :, np.newaxis]
 
-    return im
+    # scale to [0, 1] in one pass
+    img = np.empty(pix.shape[:2] + (3,), dtype=np.float32)
+    np.divide(pix[:, :, :3], np.float32(255), out=img)
+
+    return img
 
 def imgPil2Cv(img0):
     """
-    Convert image from PIL format to an Skimage one.
+    Convert image from PIL format to an OpenCV one.
+
+    Input
+      img0  -  original PIL image, grayscale is replicated to 3 channels
+               and alpha is dropped
+
+    Output
+      img   -  new OpenCV image, h x w x 3 (np.uint8, BGR)
+    """
+    pix = _imgPilArr(img0)
+    if pix.ndim == 2:
+        return np.repeat(pix[:, :, np.newaxis], 3, axis=2)
+
+    # RGB(A) -> BGR
+    return np.ascontiguousarray(pix[:, :, 2::-1])
+
+def _imgPilArr(im):
+    """
+    Get the pixels of a PIL image through the buffer protocol.
 
     Input
-      img0  -  original PIL image
+      im   -  PIL image
 
     Output
-      img   -  new OpenCV image
+      pix  -  pixels, h x w | h x w x 3 | h x w x 4 (np.uint8, read-only)
     """
-    data = np.array(img0.getdata())
-    img = data.reshape(img0.size[1], img0.size[0], 3)
-    return img[:, :, [2, 1, 0]].astype(np.uint8)
+    if im.mode not in ('L', 'RGB', 'RGBA'):
+        im = im.convert('RGB')
+    return np.asarray(im)
 
 def imgPil2Ipl(img0):
     """